@@ -0,0 +1,297 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# --- Movement Analytics ---
+# Exact counts, sums and means over df_codes, grouped by a coding dimension and
+# restricted by simple filters. Used by the chat agent's tools (so the LLM gets
+# a small exact answer instead of counting rows itself) and by the /api/stats
+# endpoints. Everything is vectorized pandas; results are plain JSON types.
+
+# Public dimension name -> df_codes column ("theme" is spread over Theme_* columns)
+DIMENSIONS = {
+    "year": "year",
+    "area": "area",
+    "regime": "Regime_Democracy",
+    "outcome": "Outcome",
+    "iso": "ISO",
+    "kind": "Kind_Movement",
+}
+THEMES = {
+    "political": "Theme_political",
+    "economic": "Theme_economic",
+    "environmental": "Theme_environmental",
+    "social": "Theme_social",
+    "other": "Theme_others",
+}
+METRICS = {"tweets": "#tweets", "length_days": "Length_Days"}
+OPERATIONS = ("count", "sum", "mean")
+LOOKUP_FIELDS = ["index", "protest_name", "year", "area", "ISO", "Regime_Democracy", "Outcome", "#tweets", "Length_Days"]
+
+
+def _normalized(series):
+    return series.astype("string").str.strip().str.lower()
+
+
+def iso_codes(series):
+    """Country codes per row position; multi-country movements list several ("USA, GBR") and have one entry each."""
+    codes = series.astype("string").str.upper().str.split(",")
+    codes = pd.Series(codes.to_numpy(), index=np.arange(len(series))).explode().str.strip()
+    return codes[codes.notna() & (codes != "")].astype(object)
+
+
+def theme_flags(df_codes):
+    """(N, T) boolean frame: does row i have theme t (anything but 'no', as the UI tags it)."""
+    flags = {}
+    for theme, col in THEMES.items():
+        if col in df_codes.columns:
+            flags[theme] = (_normalized(df_codes[col]) != "no").fillna(True).to_numpy()
+    return pd.DataFrame(flags, index=df_codes.index)
+
+
+def filter_mask(df_codes, filters=None, positions=None):
+    """Boolean row mask for `filters`, optionally restricted to row `positions`.
+
+    Filters: year, year_from, year_to (inclusive), theme, and any DIMENSIONS name
+    other than year (case-insensitive exact match; iso matches any of a row's countries).
+    """
+    mask = np.ones(len(df_codes), dtype=bool)
+    if positions is not None:
+        keep = np.zeros(len(df_codes), dtype=bool)
+        keep[np.asarray(positions, dtype=np.int64)] = True
+        mask &= keep
+    filters = filters or {}
+    if 'year' in df_codes.columns and any(filters.get(k) is not None for k in ("year", "year_from", "year_to")):
+        years = pd.to_numeric(df_codes['year'], errors='coerce').to_numpy()
+        if filters.get("year") is not None:
+            mask &= years == int(filters["year"])
+        if filters.get("year_from") is not None:
+            mask &= years >= int(filters["year_from"])
+        if filters.get("year_to") is not None:
+            mask &= years <= int(filters["year_to"])
+    for name, col in DIMENSIONS.items():
+        value = filters.get(name)
+        if name == "year" or value in (None, ""):
+            continue
+        if col not in df_codes.columns:
+            return np.zeros(len(df_codes), dtype=bool)
+        if name == "iso":
+            wanted = {c.strip().upper() for c in str(value).split(",") if c.strip()}
+            codes = iso_codes(df_codes[col])
+            in_country = np.zeros(len(df_codes), dtype=bool)
+            in_country[codes.index[codes.isin(wanted)].to_numpy(dtype=np.int64)] = True
+            mask &= in_country
+            continue
+        mask &= (_normalized(df_codes[col]) == str(value).strip().lower()).fillna(False).to_numpy()
+    theme = filters.get("theme")
+    if theme:
+        flags = theme_flags(df_codes)
+        theme = str(theme).strip().lower()
+        if theme not in flags.columns:
+            return np.zeros(len(df_codes), dtype=bool)
+        mask &= flags[theme].to_numpy()
+    return mask
+
+
+def _metric_values(df_codes, metric):
+    col = METRICS[metric]
+    if col not in df_codes.columns:
+        return pd.Series(np.nan, index=df_codes.index)
+    return pd.to_numeric(df_codes[col], errors='coerce')
+
+
+def _json_number(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 2)
+
+
+def _group_key(value):
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _json_value(value):
+    if pd.isna(value):
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return _json_number(value)
+    return str(value)
+
+
+def aggregate(df_codes, op="count", metric=None, group_by=None, filters=None, positions=None, limit=50):
+    """count / sum / mean of a metric over the filtered rows, optionally per group.
+
+    Returns {"op", "metric", "group_by", "filters", "rows", "value", "groups": [{"key", "rows", "value"}]};
+    groups are sorted by key for year and by value (descending) otherwise, and missing
+    group values are reported under "unknown". Grouped by iso, a multi-country
+    movement counts for each of its countries.
+    """
+    if op not in OPERATIONS:
+        raise ValueError(f"op must be one of {', '.join(OPERATIONS)}")
+    if op != "count" and metric not in METRICS:
+        raise ValueError(f"metric must be one of {', '.join(METRICS)}")
+    if group_by not in (None, "", "none", "theme") and group_by not in DIMENSIONS:
+        raise ValueError(f"group_by must be one of none, theme, {', '.join(DIMENSIONS)}")
+
+    mask = filter_mask(df_codes, filters, positions)
+    subset = df_codes[mask]
+    values = _metric_values(subset, metric) if op != "count" else pd.Series(1.0, index=subset.index)
+
+    def reduce(v):
+        if op == "count":
+            return len(v)
+        return v.sum() if op == "sum" else v.mean()
+
+    result = {
+        "op": op,
+        "metric": None if op == "count" else metric,
+        "group_by": group_by if group_by not in ("", "none") else None,
+        "filters": {k: v for k, v in (filters or {}).items() if v not in (None, "")},
+        "rows": int(mask.sum()),
+        "value": _json_number(reduce(values)),
+    }
+    if result["group_by"] is None:
+        return result
+
+    groups = []
+    if group_by == "theme":
+        flags = theme_flags(subset)
+        for theme in flags.columns:
+            in_theme = flags[theme].to_numpy()
+            groups.append({"key": theme, "rows": int(in_theme.sum()), "value": _json_number(reduce(values[in_theme]))})
+    else:
+        col = DIMENSIONS[group_by]
+        if col not in subset.columns:
+            raise ValueError(f"Column {col} is not in the dataset")
+        if group_by == "iso":
+            codes = iso_codes(subset[col])
+            rows = codes.index.to_numpy(dtype=np.int64)
+            missing = np.setdiff1d(np.arange(len(subset)), rows)
+            keys = np.concatenate([codes.to_numpy(dtype=object), np.full(len(missing), "unknown", dtype=object)])
+            values = pd.Series(values.to_numpy()[np.concatenate([rows, missing])])
+        else:
+            keys = subset[col].map(lambda v: "unknown" if pd.isna(v) or str(v).strip() == "" else _group_key(v)).to_numpy()
+            values = pd.Series(values.to_numpy())
+        grouped = values.groupby(keys, sort=False)
+        sizes = grouped.size()
+        reduced = sizes if op == "count" else (grouped.sum() if op == "sum" else grouped.mean())
+        groups = [{"key": str(k), "rows": int(sizes[k]), "value": _json_number(reduced[k])} for k in sizes.index]
+
+    if group_by == "year":
+        groups.sort(key=lambda g: g["key"])
+    else:
+        groups.sort(key=lambda g: (-(g["value"] if g["value"] is not None else -np.inf), g["key"]))
+    result["groups"] = groups[:limit] if limit else groups
+    if limit and len(groups) > limit:
+        result["groups_truncated"] = len(groups) - limit
+    return result
+
+
+def lookup(df_codes, filters=None, name_contains=None, limit=20, sort_by="tweets"):
+    """Movements matching `filters` (and a name substring), most tweets first by default."""
+    mask = filter_mask(df_codes, filters)
+    if name_contains and 'protest_name' in df_codes.columns:
+        mask &= df_codes['protest_name'].astype(str).str.contains(name_contains, case=False, regex=False).to_numpy()
+    positions = np.flatnonzero(mask)
+    if sort_by in METRICS:
+        metric = _metric_values(df_codes, sort_by).to_numpy(dtype=float)[positions]
+        positions = positions[np.argsort(-np.nan_to_num(metric, nan=-np.inf), kind='stable')]
+    cols = [c for c in LOOKUP_FIELDS if c in df_codes.columns]
+    records = []
+    for row in df_codes.iloc[positions[:limit]][cols].itertuples(index=False):
+        records.append({col: _json_value(v) for col, v in zip(cols, row)})
+    return {"filters": {k: v for k, v in (filters or {}).items() if v not in (None, "")},
+            "name_contains": name_contains or None, "count": int(len(positions)), "movements": records}
+
+
+# --- Dashboard Breakdowns ---
+# Movement counts, tweet totals and the best-known movement names per year,
+# theme, regime or country: what the dashboard charts draw, in kilobytes.
+BREAKDOWNS = ("year", "theme", "regime", "iso", "area", "outcome")
+
+
+def _group_keys(df_codes, dimension):
+    """(row position, group key) pairs for one breakdown; a row can fall into several groups."""
+    positions = np.arange(len(df_codes))
+    if dimension == "theme":
+        flags = theme_flags(df_codes)
+        rows, cols = np.nonzero(flags.to_numpy())
+        return pd.Series(flags.columns.to_numpy()[cols], index=rows)
+    col = DIMENSIONS[dimension]
+    if col not in df_codes.columns:
+        return pd.Series([], dtype=object)
+    if dimension == "year":
+        years = pd.to_numeric(df_codes[col], errors='coerce').to_numpy()
+        valid = ~np.isnan(years)
+        return pd.Series(years[valid].astype(np.int64).astype(str), index=positions[valid])
+    if dimension == "iso":
+        return iso_codes(df_codes[col])
+    values = pd.Series(df_codes[col].astype("string").str.strip().to_numpy(), index=positions)
+    keys = values.fillna("").to_numpy(dtype=object)
+    keys[keys == ""] = "unknown"
+    if dimension in ("regime", "outcome"):
+        keys = np.array([k.lower() for k in keys], dtype=object)
+    return pd.Series(keys, index=positions)
+
+
+def breakdown(df_codes, dimension, mask=None, top_names=5):
+    """{"dimension", "rows", "groups": [{"key", "count", "tweets", "movements"}]} over the rows in mask.
+
+    Years come in chronological order, other groups by count (descending). "movements"
+    holds up to top_names names per group, most tweets first.
+    """
+    if dimension not in BREAKDOWNS:
+        raise ValueError(f"dimension must be one of {', '.join(BREAKDOWNS)}")
+    if mask is None:
+        mask = np.ones(len(df_codes), dtype=bool)
+    keys = _group_keys(df_codes, dimension)
+    keys = keys[mask[keys.index.to_numpy(dtype=np.int64)]] if len(keys) else keys
+    result = {"dimension": dimension, "rows": int(mask.sum()), "groups": []}
+    if keys.empty:
+        return result
+
+    rows = keys.index.to_numpy(dtype=np.int64)
+    tweets = _metric_values(df_codes, "tweets").to_numpy(dtype=float)[rows]
+    names = df_codes['protest_name'].astype(str).str.strip().to_numpy()[rows] if 'protest_name' in df_codes.columns else np.full(len(rows), "")
+    frame = pd.DataFrame({"key": keys.to_numpy(dtype=object), "tweets": tweets, "name": names})
+    grouped = frame.groupby("key", sort=False)
+    stats = grouped.agg(count=("name", "size"), tweets=("tweets", "sum"))
+    ranked = frame.sort_values("tweets", ascending=False, kind="stable", na_position="last")
+    top = ranked.groupby("key", sort=False).head(top_names).groupby("key", sort=False)["name"].agg(list)
+
+    order = sorted(stats.index) if dimension == "year" else sorted(stats.index, key=lambda k: (-stats.at[k, "count"], k))
+    result["groups"] = [
+        {"key": key, "count": int(stats.at[key, "count"]), "tweets": _json_number(stats.at[key, "tweets"]),
+         "movements": top.get(key, [])}
+        for key in order
+    ]
+    return result
+
+
+class StatsCache:
+    """Serialized breakdowns keyed by (data version, ...), bounded LRU; older versions are dropped."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+        value = build()
+        with self._lock:
+            for old in [k for k in self._entries if k[0] != key[0]]:
+                del self._entries[old]
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
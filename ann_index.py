@@ -0,0 +1,154 @@
+import numpy as np
+import os
+import time
+
+from retrieval import count_matches, select_top_k, normalize_query
+
+# --- Approximate Nearest-Neighbour Index (IVF) ---
+# Inverted-file index in pure numpy. Spherical k-means splits the normalized
+# corpus into `nlist` cells; a query is scored against the centroids first and
+# then only against the rows of the `nprobe` closest cells. Larger nprobe means
+# higher recall and more latency; nprobe == nlist is exact.
+#
+# The index stores centroids and row assignments only. Vectors stay in the
+# memory-mapped vector store, and the index file sits next to it, named after
+# the store generation it was built for.
+
+
+class IVFIndex:
+    def __init__(self, centroids, list_offsets, list_rows, generation=""):
+        self.centroids = centroids          # (nlist, D) float32, normalized
+        self.list_offsets = list_offsets    # (nlist + 1,) int64, CSR-style offsets into list_rows
+        self.list_rows = list_rows          # (N,) int64, row ids grouped by cell, ascending in each cell
+        self.generation = generation
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, matrix, nlist=0, n_iter=10, max_train=0, seed=0, generation=""):
+        """Train spherical k-means on (a sample of) `matrix` and assign every row to a cell."""
+        n = matrix.shape[0]
+        if nlist <= 0:
+            nlist = max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+
+        # Training sample: a few dozen points per centroid is enough for coarse cells
+        max_train = max_train or 32 * nlist
+        sample_rows = np.sort(rng.choice(n, size=min(n, max_train), replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+        for _ in range(n_iter):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(assign, minlength=nlist)
+            # Per-cell sums via one sort + reduceat (np.add.at is far slower)
+            order = np.argsort(assign, kind='stable')
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            sums = np.zeros_like(centroids)
+            nonempty = counts > 0
+            sums[nonempty] = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+            empty = ~nonempty
+            if empty.any():
+                # Re-seed empty cells from random sample points
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        # Assign the full corpus in chunks (matrix may be a memmap)
+        assign = np.empty(n, dtype=np.int64)
+        for start in range(0, n, 65536):
+            block = np.asarray(matrix[start:start + 65536], dtype=np.float32)
+            assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        list_rows = np.argsort(assign, kind='stable')
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=list_offsets[1:])
+        return cls(centroids, list_offsets, list_rows, generation)
+
+    def candidates(self, query, nprobe):
+        """Row ids in the `nprobe` cells closest to the (normalized) query."""
+        nprobe = max(1, min(nprobe, self.nlist))
+        cell_scores = self.centroids @ query
+        if nprobe < self.nlist:
+            cells = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+        else:
+            cells = np.arange(self.nlist)
+        parts = [self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in cells]
+        rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        # Ascending row order keeps memmap reads sequential
+        rows.sort()
+        return rows
+
+    def search(self, matrix, query, k=20, threshold=None, nprobe=8, with_total=False, allowed=None):
+        """Approximate top-k. Returns (indices into matrix, scores), best first.
+
+        with_total adds the number of probed rows above threshold (a lower bound
+        of the exact count). `allowed` is an optional boolean mask over matrix
+        rows; probed rows outside it are not scored.
+        """
+        q = normalize_query(query)
+        rows = self.candidates(q, nprobe)
+        if allowed is not None:
+            rows = rows[allowed[rows]]
+        if rows.size == 0:
+            empty = (rows, np.empty(0, dtype=np.float32))
+            return empty + (0,) if with_total else empty
+        scores = np.asarray(matrix[rows]) @ q
+        idx = select_top_k(scores, k, threshold)
+        if with_total:
+            return rows[idx], scores[idx], count_matches(scores, threshold)
+        return rows[idx], scores[idx]
+
+    # --- Persistence ---
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, centroids=self.centroids, list_offsets=self.list_offsets,
+                     list_rows=self.list_rows, generation=np.array(self.generation))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["centroids"], data["list_offsets"], data["list_rows"], str(data["generation"]))
+
+
+def index_path(store_dir, generation):
+    return os.path.join(store_dir, f"ivf-{generation}.npz")
+
+
+def load_or_build(matrix, store_dir, generation, min_vectors, nlist=0):
+    """IVF index for this store generation, or None when the corpus is small enough for brute force."""
+    if matrix is None or matrix.shape[0] < min_vectors:
+        return None
+    path = index_path(store_dir, generation)
+    if os.path.exists(path):
+        try:
+            index = IVFIndex.load(path)
+            if index.generation == generation and index.list_rows.shape[0] == matrix.shape[0]:
+                return index
+        except Exception as e:
+            print(f"Rebuilding unreadable ANN index {path}: {e}")
+    start = time.perf_counter()
+    index = IVFIndex.build(matrix, nlist=nlist, generation=generation)
+    try:
+        index.save(path)
+    except OSError as e:
+        print(f"Could not persist ANN index: {e}")
+    print(f"Built IVF index ({index.nlist} cells over {matrix.shape[0]} vectors) in {time.perf_counter() - start:.1f}s")
+    return index
+
+
+def recall_at_k(index, matrix, queries, k=20, nprobe=8):
+    """Fraction of exact top-k neighbours the index returns, averaged over `queries`."""
+    from retrieval import top_k
+    hits = 0
+    for q in queries:
+        exact, _ = top_k(matrix, q, k=k)
+        approx, _ = index.search(matrix, q, k=k, nprobe=nprobe)
+        hits += len(set(exact.tolist()) & set(approx.tolist()))
+    return hits / (k * len(queries))
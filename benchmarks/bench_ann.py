@@ -0,0 +1,65 @@
+"""Recall vs latency of the IVF index (ann_index.py) against exact top-k.
+
+Uses clustered synthetic vectors (a Gaussian mixture), which behave much more
+like real embeddings than isotropic noise.
+
+Usage: python benchmarks/bench_ann.py [--n 100000] [--dim 1536] [--nprobe 1 4 8 16 32]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ann_index import IVFIndex, recall_at_k  # noqa: E402
+from retrieval import top_k  # noqa: E402
+from vector_store import l2_normalize  # noqa: E402
+
+
+def clustered_vectors(n, dim, n_clusters, rng):
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 16384):
+        block = labels[start:start + 16384]
+        out[start:start + len(block)] = centers[block] + 0.6 * rng.standard_normal((len(block), dim)).astype(np.float32)
+    return l2_normalize(out), centers
+
+
+def mean_latency(fn, queries):
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix, centers = clustered_vectors(args.n, args.dim, max(8, args.n // 500), rng)
+    queries = l2_normalize(centers[rng.integers(0, len(centers), args.queries)]
+                           + 0.8 * rng.standard_normal((args.queries, args.dim)).astype(np.float32))
+
+    start = time.perf_counter()
+    index = IVFIndex.build(matrix)
+    print(f"Built {index.nlist} cells over {args.n} x {args.dim} in {time.perf_counter() - start:.1f}s")
+
+    exact_ms = mean_latency(lambda q: top_k(matrix, q, k=20), queries) * 1e3
+    print(f"{'nprobe':>7} {'recall@20':>10} {'ms/query':>9} {'vs exact':>9}")
+    print(f"{'exact':>7} {1.0:>10.3f} {exact_ms:>9.2f} {1.0:>8.1f}x")
+    for nprobe in args.nprobe:
+        ms = mean_latency(lambda q: index.search(matrix, q, k=20, nprobe=nprobe), queries) * 1e3
+        recall = recall_at_k(index, matrix, queries, k=20, nprobe=nprobe)
+        print(f"{nprobe:>7} {recall:>10.3f} {ms:>9.2f} {exact_ms / ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Serialization cost of one /api/search response, old path vs pre-serialized bytes.
+
+Old path: FastAPI validates the List[Movement] response_model, runs it through
+jsonable_encoder and JSONResponse renders it with the stdlib json encoder.
+New path: server.movements_json() concatenates the per-movement orjson bytes
+built at load time and only encodes the similarity values.
+
+Reports best-of-N time and the tracemalloc peak per response. Loads the real
+dataset (snapshot or Excel files) from the repository root.
+
+Usage: python benchmarks/bench_serialization.py [--sizes 20 100] [--repeat 200]
+"""
+import argparse
+import asyncio
+import dataclasses
+import os
+import sys
+import time
+import tracemalloc
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+import server  # noqa: E402
+from data_snapshot import load_frames  # noqa: E402
+
+
+def best_of(fn, repeat):
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_bytes(fn):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    df_codes, df_rational, _ = load_frames()
+    movements, movement_pos = server.build_movements(df_codes, df_rational)
+    store = dataclasses.replace(
+        server.EMPTY_STORE, df_codes=df_codes, movements=movements,
+        movement_pos=movement_pos, movement_json=server.serialize_movements(movements),
+    )
+
+    field = create_response_field(name="Response_search_movements", type_=List[server.Movement], mode="serialization")
+    loop = asyncio.new_event_loop()
+
+    def legacy(positions, similarities):
+        page = [movements[p].model_copy(update={"similarity": s}) for p, s in zip(positions, similarities)]
+        content = loop.run_until_complete(serialize_response(field=field, response_content=page))
+        return JSONResponse(content).body
+
+    def current(positions, similarities):
+        return server.movements_json(store, positions, similarities)
+
+    print(f"{'results':>8} {'old ms':>8} {'new ms':>8} {'speedup':>8} {'old peak KiB':>13} {'new peak KiB':>13} {'bytes':>9}")
+    valid = [i for i, m in enumerate(movements) if m is not None]
+    for size in args.sizes:
+        positions = [valid[i % len(valid)] for i in range(size)]
+        similarities = [round(90.0 - i * 0.5, 1) for i in range(size)]
+        t_old = best_of(lambda: legacy(positions, similarities), args.repeat)
+        t_new = best_of(lambda: current(positions, similarities), args.repeat)
+        m_old = peak_bytes(lambda: legacy(positions, similarities))
+        m_new = peak_bytes(lambda: current(positions, similarities))
+        size_bytes = len(current(positions, similarities))
+        print(f"{size:>8} {t_old * 1e3:>8.3f} {t_new * 1e3:>8.3f} {t_old / t_new:>7.1f}x "
+              f"{m_old / 1024:>13.1f} {m_new / 1024:>13.1f} {size_bytes:>9}")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
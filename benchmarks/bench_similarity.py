@@ -0,0 +1,72 @@
+"""Microbenchmark: /api/search vector scoring, old path vs retrieval.top_k.
+
+Old path: sklearn cosine_similarity over the float64 matrix + full argsort.
+New path: one float32 dot product over pre-normalized rows + argpartition.
+
+Usage: python benchmarks/bench_similarity.py [--sizes 10000 100000] [--dim 1536]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from retrieval import top_k, top_k_batch  # noqa: E402
+from vector_store import l2_normalize  # noqa: E402
+
+
+def best_of(fn, repeat):
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def legacy_search(matrix64, q, cosine_similarity):
+    scores = cosine_similarity(matrix64, q.reshape(1, -1)).flatten()
+    return scores.argsort()[-20:][::-1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=32, help="queries per batched call")
+    args = parser.parse_args()
+
+    try:
+        from sklearn.metrics.pairwise import cosine_similarity
+    except ImportError:
+        cosine_similarity = None
+        print("scikit-learn not installed: skipping the legacy baseline.")
+
+    rng = np.random.default_rng(0)
+    print(f"{'N':>8} {'legacy ms':>10} {'top_k ms':>9} {'speedup':>8} {'batch ms/query':>15}")
+    for n in args.sizes:
+        raw = rng.standard_normal((n, args.dim)).astype(np.float32)
+        matrix = l2_normalize(raw)
+        q = rng.standard_normal(args.dim).astype(np.float32)
+        qs = rng.standard_normal((args.batch, args.dim)).astype(np.float32)
+
+        t_new = best_of(lambda: top_k(matrix, q, k=20, threshold=0.15), args.repeat)
+        t_batch = best_of(lambda: top_k_batch(matrix, qs, k=20), args.repeat) / args.batch
+
+        if cosine_similarity is not None:
+            matrix64 = raw.astype(np.float64)
+            q64 = q.astype(np.float64)
+            t_old = best_of(lambda: legacy_search(matrix64, q64, cosine_similarity), args.repeat)
+            del matrix64
+            print(f"{n:>8} {t_old * 1e3:>10.2f} {t_new * 1e3:>9.2f} {t_old / t_new:>7.1f}x {t_batch * 1e3:>15.3f}")
+        else:
+            print(f"{n:>8} {'-':>10} {t_new * 1e3:>9.2f} {'-':>8} {t_batch * 1e3:>15.3f}")
+        del raw, matrix
+
+
+if __name__ == "__main__":
+    main()
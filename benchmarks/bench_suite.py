@@ -0,0 +1,239 @@
+"""End-to-end benchmark suite on synthetic datasets (benchmarks/synthetic_data.py).
+
+For each dataset size it writes a synthetic snapshot + fake vector store into a
+scratch working directory, points the server at it and times:
+
+  load_data             first load (builds the ANN index on large corpora) and warm reloads
+  build_movements       all Movements; map_row_to_movement per row
+  search.<route>        /api/search per route: empty, hashtag, year, region,
+                        filter, hybrid, vector and keyword
+  rationales.hit/miss   /api/rationales by ID, and through the name fallback
+  context.*             full-database chat context (csv = the original
+                        full-context builder, compact with the token budget) and the
+                        retrieval context for one question
+
+The embeddings API is never called: OPENAI_API_KEY is cleared, and the vector
+routes get a stub client whose query vector is a stored row. Query
+vectors then come from the query cache, as for repeated queries in production,
+so search.vector measures scoring, mapping and serialization only.
+
+Results go to a JSON file (timings in ms: min, p50, p95, mean, runs) with the
+git commit and library versions, so runs can be compared between commits:
+
+Usage: python benchmarks/bench_suite.py [--sizes 1000 10000 100000] [--dim 1536]
+           [--output benchmarks/results/suite.json] [--compare OLD.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+os.environ["OPENAI_API_KEY"] = ""  # never reach the API from a benchmark
+
+from synthetic_data import write_dataset  # noqa: E402
+
+SEARCH_QUERIES = {
+    "empty": "",
+    "hashtag": "#climate",
+    "year": "2015",
+    "region": "EU",
+    "filter": "protests in Asia after 2016",
+    "hybrid": "police violence in Europe after 2015",
+    "vector": "pipeline protest by indigenous groups",
+    "keyword": "pipeline protest by indigenous groups",
+}
+
+
+def measure(fn, repeat, budget, warmup=True):
+    """Timings in ms of up to `repeat` calls (at least min(3, repeat)), stopping once `budget` seconds are spent."""
+    if warmup:
+        fn()
+    times, spent = [], 0.0
+    while len(times) < repeat and (spent < budget or len(times) < min(3, repeat)):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed * 1e3)
+        spent += elapsed
+    return summarize(times)
+
+
+def summarize(times):
+    ordered = sorted(times)
+    return {
+        "min": round(ordered[0], 4),
+        "p50": round(statistics.median(ordered), 4),
+        "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 4),
+        "mean": round(statistics.fmean(ordered), 4),
+        "runs": len(ordered),
+    }
+
+
+def stub_client(vector):
+    """AsyncOpenAI stand-in for the vector routes: returns a fixed query embedding, no network."""
+    async def create(input, model):
+        return types.SimpleNamespace(data=[types.SimpleNamespace(embedding=vector.tolist())])
+    return types.SimpleNamespace(embeddings=types.SimpleNamespace(create=create))
+
+
+def bench_size(server, n, args):
+    import chat_context
+    import context_selector
+    from retrieval import top_k
+
+    results = {}
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        start = time.perf_counter()
+        assert server.load_data(), "load_data failed"
+        results["load_data.first"] = summarize([(time.perf_counter() - start) * 1e3])
+        results["load_data"] = measure(server.load_data, args.load_repeat, args.budget, warmup=False)
+    store = server.get_store()
+    df_codes, df_rational = store.df_codes, store.df_rational
+    print(f"  loaded {len(df_codes)} movements, {0 if store.embeddings is None else len(store.embeddings)} vectors, "
+          f"ANN {'on' if store.ann_index is not None else 'off'}")
+
+    with quiet:
+        results["build_movements"] = measure(lambda: server.build_movements(df_codes, df_rational), args.load_repeat, args.budget)
+        rationale_rows = {str(r['index']): r for _, r in df_rational.drop_duplicates(subset='index').iterrows()}
+        sample = [row for _, row in df_codes.head(min(len(df_codes), 500)).iterrows()]
+        per_row = measure(lambda: [server.map_row_to_movement(row, rationale_rows.get(str(row['index']))) for row in sample],
+                          args.repeat, args.budget)
+        results["map_row_to_movement"] = {k: (round(v / len(sample), 4) if k != "runs" else v) for k, v in per_row.items()}
+
+    loop = asyncio.new_event_loop()
+
+    def search(q, client):
+        server._ASYNC_CLIENT = client
+        return loop.run_until_complete(server.search_movements(
+            q=q, view="full", fields=None, limit=20, cursor=None,
+            year_from=None, year_to=None, area=None, theme=None, regime=None))
+
+    client = stub_client(np.asarray(store.embeddings[0]))
+    with quiet:
+        for route, q in SEARCH_QUERIES.items():
+            use = None if route == "keyword" else client
+            results[f"search.{route}"] = measure(lambda: search(q, use), args.repeat, args.budget)
+    server._ASYNC_CLIENT = None
+    loop.close()
+
+    matched = set(df_rational['index'])
+    hit_ids = [i for i in df_codes['index'].head(50) if i in matched][:20]
+    miss_ids = [i for i in df_codes['index'] if i not in matched][:5]
+    with quiet:
+        results["rationales.hit"] = measure(lambda: [server.get_rationales(i) for i in hit_ids], args.repeat, args.budget)
+        results["rationales.hit"]["ids"] = len(hit_ids)
+        if miss_ids:
+            results["rationales.miss"] = measure(lambda: [server.get_rationales(i) for i in miss_ids], args.repeat, args.budget)
+            results["rationales.miss"]["ids"] = len(miss_ids)
+
+        results["context.csv"] = measure(lambda: chat_context.build_context(df_codes, "csv", 0), 5, args.budget)
+        results["context.compact_budget"] = measure(
+            lambda: chat_context.build_context(df_codes, "compact", server.CHAT_CONTEXT_MAX_TOKENS), 5, args.budget)
+        results["context.cached"] = measure(lambda: server.full_database_context(store), args.repeat, args.budget)
+        question = "how many climate protests happened in Europe after 2015?"
+        rows, _ = top_k(store.embeddings, store.embeddings[0], k=server.CHAT_CONTEXT_TOP_K)
+        semantic = [int(store.embedding_pos[i]) for i in rows if store.embedding_pos[i] >= 0]
+        aggregates = server.FULL_CONTEXT.aggregates(df_codes, store.version)
+        results["context.retrieval"] = measure(
+            lambda: context_selector.select_context(store, question, semantic, server.CHAT_CONTEXT_TOP_K,
+                                                    server.CHAT_CONTEXT_FORMAT, server.CHAT_CONTEXT_MAX_TOKENS,
+                                                    aggregates), args.repeat, args.budget)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(old_path, new):
+    with open(old_path) as f:
+        old = json.load(f)
+    print(f"\nCompared with {old_path} ({old['meta'].get('commit')}), p50 ms:")
+    print(f"{'size':>7} {'benchmark':<26} {'old':>10} {'new':>10} {'ratio':>7}")
+    for size, benches in new["results"].items():
+        for name, stats in benches.items():
+            before = old["results"].get(size, {}).get(name)
+            if before:
+                ratio = stats["p50"] / before["p50"] if before["p50"] else float("inf")
+                flag = "  <-- slower" if ratio > 1.2 else ""
+                print(f"{size:>7} {name:<26} {before['p50']:>10.3f} {stats['p50']:>10.3f} {ratio:>6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=50, help="max timed runs per benchmark")
+    parser.add_argument("--load-repeat", type=int, default=3, help="max timed load_data/build_movements runs")
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds per benchmark before stopping early")
+    parser.add_argument("--output", default=None, help="default: benchmarks/results/suite-<commit>.json")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    parser.add_argument("--workdir", default=None, help="keep the synthetic datasets here instead of a temp dir")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    output = os.path.abspath(args.output or os.path.join(BENCH_DIR, "results", f"suite-{commit}.json"))
+    base = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="movement-bench-")
+
+    import pandas as pd
+    report = {
+        "meta": {
+            "commit": commit,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "dim": args.dim,
+        },
+        "results": {},
+    }
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import server
+
+    for n in args.sizes:
+        directory = os.path.join(base, f"n{n}")
+        os.makedirs(directory, exist_ok=True)
+        print(f"[{n} movements] generating dataset in {directory} ...")
+        start = time.perf_counter()
+        write_dataset(directory, n, args.dim, model=server.EMBEDDING_MODEL)
+        print(f"  generated in {time.perf_counter() - start:.1f}s")
+        # Relative data paths (snapshot, vector store) resolve against the working directory
+        os.chdir(directory)
+        report["results"][str(n)] = bench_size(server, n, args)
+        for name, stats in report["results"][str(n)].items():
+            print(f"  {name:<26} p50 {stats['p50']:>10.3f} ms   p95 {stats['p95']:>10.3f} ms")
+
+    os.chdir(ROOT)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {output}")
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
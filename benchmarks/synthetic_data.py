@@ -0,0 +1,258 @@
+"""Synthetic movement datasets with the schema of the real coding workbooks.
+
+generate_frames(n) returns (df_codes, df_rational) shaped like data_snapshot.load_frames()
+output for the Coding_clean / CodingRationale_clean sheets: the same columns,
+dtypes and value vocabularies, mixed-type count columns, missing values, a
+rationale table whose IDs mostly (but not always) match, and descriptions
+built from a shared vocabulary so keyword and hashtag indexes get realistic
+posting lists.
+
+write_dataset(directory, n, dim) lays out a working directory the server can
+load without Excel or the embeddings API: a compiled snapshot (data_snapshots/)
+for the default source paths, plus a vector store (vector_store/) of clustered
+fake embeddings whose text hashes match, so load_data() reuses every vector.
+
+Usage: python benchmarks/synthetic_data.py OUT_DIR [--n 10000] [--dim 1536]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+YES_NO_CODES = ["SMO_Leaders", "Grassroots_Mobilization", "Symbolic_Figures", "Offline", "Self_Disclosure",
+                "Theme_political", "Theme_economic", "Theme_environmental", "Theme_social", "Theme_others",
+                "Protester_Violence", "Reoccurrence", "State_response_accomendation", "Acceptance", "Advantage",
+                "State_response_distraction", "State_response_repression", "Physical_repression",
+                "Legal_repression", "State_response_ignore", "Ignore", "Attrition"]
+# P(yes) per column, roughly as in the real table
+YES_RATE = {"Offline": 0.77, "Theme_political": 0.45, "Theme_economic": 0.16, "Theme_environmental": 0.16,
+            "Theme_social": 0.49, "Theme_others": 0.02, "State_response_repression": 0.46,
+            "State_response_distraction": 0.07, "State_response_ignore": 0.42, "State_response_accomendation": 0.56}
+AREAS = ["GLOBAL", "EU", "AS", "AF", "SA", "OA", None]
+AREA_P = [0.32, 0.24, 0.11, 0.06, 0.03, 0.01, 0.23]
+ISOS = ["USA", "GBR", "DEU", "FRA", "ESP", "ITA", "TUR", "RUS", "UKR", "CHN", "HKG", "IND", "PAK", "IRN", "EGY",
+        "NGA", "KEN", "ZAF", "BRA", "CHL", "ARG", "MEX", "CAN", "AUS", "JPN", "KOR", "IDN", "PHL", "THA", "MMR",
+        "SDN", "DZA", "LBN", "ISR", "POL", "HUN", "GRC"]
+REGIMES = ["democracy", "semi-democracy", "authoritarian", None]
+REGIME_P = [0.81, 0.08, 0.06, 0.05]
+OUTCOMES = ["other reactions", "policy revision", "fail", "major policy change", "regime change", None]
+OUTCOME_P = [0.30, 0.16, 0.14, 0.11, 0.02, 0.27]
+VOCAB = {
+    "Scale": ["transnational", "national", "local"],
+    "Scope_issues": ["transnational", "national", "local"],
+    "Kind_Movement": ["non-election campaign", "election campaign", "protest", "others"],
+    "Goal": ["others", "reform", "revolutionary"],
+    "Key_Participants": ["general public", "other social groups", "LGBTQIA2+", "women", "young",
+                         "racial minority", "religious groups", "men"],
+    "Longterm": ["no", "continue", "contraction"],
+    "scraping": ["Done", "No"],
+}
+TOPICS = ["climate", "police", "election", "women", "students", "workers", "refugees", "tax", "pipeline",
+          "housing", "pension", "internet", "vaccine", "corruption", "water", "farmers", "teachers", "nurses",
+          "tuition", "fuel", "mining", "forest", "privacy", "minimum wage", "gun control", "abortion",
+          "independence", "democracy", "free speech", "tourism"]
+KINDS = ["Movement", "Protests", "Campaign", "Strike", "March", "Revolution"]
+PLACES = ["Berlin", "Hong Kong", "Chile", "Lagos", "Istanbul", "Paris", "Seoul", "Delhi", "Cairo", "Kyiv",
+          "Madrid", "Toronto", "Sydney", "Tehran", "Minsk", "Bangkok", "Santiago", "Nairobi"]
+WORDS = ("the movement began protest online offline government police response activists organized march "
+         "rally demands reform policy rights social media hashtag campaign supporters participants city "
+         "national global local violence peaceful arrests injuries outcome change law parliament court "
+         "election vote youth students workers union climate environment economy inflation housing "
+         "corruption freedom justice equality gender race minority refugees migration health education").split()
+
+
+def _choice(rng, values, n, p=None):
+    return np.array(values, dtype=object)[rng.choice(len(values), size=n, p=p)]
+
+
+def _text(rng, n, words, topics):
+    """n short descriptions (40-90 words) mentioning each row's topic."""
+    lengths = rng.integers(40, 90, size=n)
+    picks = rng.integers(0, len(WORDS), size=int(lengths.sum()))
+    out, start = [], 0
+    for length, topic in zip(lengths, topics):
+        body = " ".join(words[picks[start:start + length]])
+        out.append(f"A {topic} movement. {body}.")
+        start += length
+    return out
+
+
+def _mixed_counts(rng, n, scale):
+    """Object column mixing ints, floats, NaN and free text, like Injuries_total or Number_Participants."""
+    values = rng.poisson(scale, size=n).astype(object)
+    kind = rng.random(n)
+    values[kind < 0.3] = np.nan
+    values[(kind >= 0.3) & (kind < 0.4)] = ">1"
+    floats = (kind >= 0.4) & (kind < 0.55)
+    values[floats] = [float(v) for v in rng.poisson(scale, size=int(floats.sum()))]
+    return values
+
+
+def generate_frames(n, seed=0, rationale_mismatch=0.05):
+    """(df_codes, df_rational) with n movements, as load_frames() returns them."""
+    rng = np.random.default_rng(seed)
+    words = np.array(WORDS, dtype=object)
+    no = np.arange(1, n + 1)
+    index = [str(i) for i in no]
+    topics = _choice(rng, TOPICS, n)
+    names = [f"{y} {place} {topic.title()} {kind}" for y, place, topic, kind in
+             zip(rng.integers(2009, 2021, size=n), _choice(rng, PLACES, n), topics, _choice(rng, KINDS, n))]
+    tags = [f"#{topic.replace(' ', '')}{i % max(1, n // 4)}" for i, topic in enumerate(topics)]
+    years = rng.integers(2009, 2021, size=n)
+    start = pd.to_datetime([f"{y}-01-01" for y in years]) + pd.to_timedelta(rng.integers(0, 365, size=n), unit="D")
+    duration = rng.integers(1, 2000, size=n)
+    length_days = duration.astype(float)
+    length_days[rng.random(n) < 0.5] = np.nan
+    descriptions = _text(rng, n, words, topics)
+
+    codes = {
+        "no": no,
+        "index": index,
+        "protest_name": names,
+        "query": [f"{t} or #{topic.replace(' ', '')}" for t, topic in zip(tags, topics)],
+        "s_time": start.astype("datetime64[us]"),
+        "e_time": (start + pd.to_timedelta(duration, unit="D")).astype("datetime64[us]"),
+        "#tweets": rng.lognormal(11, 2.5, size=n).astype(np.int64),
+        "scraping": _choice(rng, VOCAB["scraping"], n, [0.9, 0.1]),
+        "year": years.astype(np.int64),
+        "duration": duration.astype(np.int64),
+        "Scale": _choice(rng, VOCAB["Scale"], n),
+        "Scope_issues": _choice(rng, VOCAB["Scope_issues"], n),
+        "area": _choice(rng, AREAS, n, AREA_P),
+        "ISO": _choice(rng, ISOS + [None], n),
+        "Regime_Democracy": _choice(rng, REGIMES, n, REGIME_P),
+    }
+    for col in YES_NO_CODES:
+        codes[col] = np.where(rng.random(n) < YES_RATE.get(col, 0.5), "yes", "no").astype(object)
+    codes.update({
+        "Figures_Name": _choice(rng, ["Alan Kurdi", "Greta Thunberg", "Joshua Wong", None, None], n),
+        "Kind_Movement": _choice(rng, VOCAB["Kind_Movement"], n),
+        "Goal": _choice(rng, VOCAB["Goal"], n),
+        "Twitter_Penetration": [f"{v} million" for v in rng.integers(1, 400, size=n)],
+        "Penetration_statista_ISO": [f"{v / 100:.2f} million, https://www.statista.com/statistics/{v}" for v in rng.integers(1, 10000, size=n)],
+        "Penetration_datareportal_ISO": [f"{v}%, https://datareportal.com/reports/digital-{v}" for v in rng.integers(1, 90, size=n)],
+        "Penetration_ISO_penetrationrate": _mixed_counts(rng, n, 1).astype(object),
+        "Key_Participants": _choice(rng, VOCAB["Key_Participants"], n),
+        "Number_Participants": _mixed_counts(rng, n, 50000),
+        "Injuries_total": _mixed_counts(rng, n, 3),
+        "Police_injuries": _mixed_counts(rng, n, 1),
+        "Deaths_total": _mixed_counts(rng, n, 1),
+        "Police_deaths": _mixed_counts(rng, n, 0.2),
+        "Arrested": _mixed_counts(rng, n, 20),
+        "Length_Days": length_days,
+        "Outcome": _choice(rng, OUTCOMES, n, OUTCOME_P),
+        "Longterm": _choice(rng, VOCAB["Longterm"], n),
+        "Wikipedia": [f"https://en.wikipedia.org/wiki/{name.replace(' ', '_')}" for name in names],
+        "keywords_processed": [f"{t} or {topic}" for t, topic in zip(tags, topics)],
+        "Keywords_FACTIVA_for_daybyday_search": [f"{t} or {topic} " for t, topic in zip(tags, topics)],
+        "Paper_index": rng.integers(1, 400, size=n).astype(np.int64),
+        "Publication_Year": rng.integers(2012, 2024, size=n).astype(np.int64),
+        "Authors": [f"Author{a}, A; Author{b}, B" for a, b in rng.integers(0, 5000, size=(n, 2))],
+        "Article_Title": [f"Understanding {topic} mobilization online" for topic in topics],
+    })
+    # Column order of the Coding_clean sheet
+    order = ["no", "index", "protest_name", "query", "s_time", "e_time", "#tweets", "scraping", "year", "duration",
+             "Scale", "Scope_issues", "area", "ISO", "Regime_Democracy", "SMO_Leaders", "Grassroots_Mobilization",
+             "Symbolic_Figures", "Figures_Name", "Offline", "Kind_Movement", "Goal", "Self_Disclosure",
+             "Twitter_Penetration", "Penetration_statista_ISO", "Penetration_datareportal_ISO",
+             "Penetration_ISO_penetrationrate", "Theme_political", "Theme_economic", "Theme_environmental",
+             "Theme_social", "Theme_others", "Protester_Violence", "Key_Participants", "Number_Participants",
+             "Injuries_total", "Police_injuries", "Deaths_total", "Police_deaths", "Arrested", "Reoccurrence",
+             "Length_Days", "State_response_accomendation", "Acceptance", "Advantage", "State_response_distraction",
+             "State_response_repression", "Physical_repression", "Legal_repression", "State_response_ignore",
+             "Ignore", "Attrition", "Outcome", "Longterm", "Wikipedia", "keywords_processed",
+             "Keywords_FACTIVA_for_daybyday_search", "Paper_index", "Publication_Year", "Authors", "Article_Title"]
+    df_codes = pd.DataFrame({col: codes[col] for col in order})
+    for col in ("Penetration_ISO_penetrationrate", "Number_Participants", "Injuries_total", "Police_injuries",
+                "Deaths_total", "Police_deaths", "Arrested"):
+        df_codes[col] = df_codes[col].astype(object)
+
+    # Rationale sheet: free-text justifications per coded column, mostly aligned by index.
+    # A few rows carry an ID the codes table does not have (the name fallback path).
+    rat_index = list(index)
+    for i in np.flatnonzero(rng.random(n) < rationale_mismatch):
+        rat_index[i] = f"{n + 1 + i}"
+    justification = [f"Coded from news coverage of the {topic} protests." for topic in topics]
+    rational = {
+        "no": no,
+        "index": rat_index,
+        "protest_name_v2": names,
+        "Description": descriptions,
+    }
+    for col in ("Scale", "Scope_issues", "area", "ISO", "Regime_Democracy", "SMO_Leaders"):
+        rational[col] = codes[col]
+    rational["Grassroots_mobilization"] = codes["Grassroots_Mobilization"]
+    for col in ("Symbolic_Figures", "Figures_Name", "Offline", "Kind_Movement"):
+        rational[col] = codes[col]
+    rational["Goal"] = _choice(rng, ["Others", "Reform of the law", "Regime change"], n)
+    rational["Self_Disclosure"] = justification
+    rational["Twitter_Penetration"] = codes["Penetration_datareportal_ISO"]
+    for col in ("Theme_political", "Theme_economic", "Theme_environmental", "Theme_social", "Theme_others",
+                "Protester_Violence"):
+        rational[col] = np.where(codes[col] == "yes", justification, "no").astype(object)
+    rational["Key_Participants"] = codes["Key_Participants"]
+    rational["Number_Participants"] = [f"https://news.example.org/{i}" for i in no]
+    for col in ("Injuries_total", "Police_injuries", "Deaths_total", "Police_deaths", "Arrested"):
+        rational[col] = codes[col]
+    rational["Reoccurrence"] = np.where(codes["Reoccurrence"] == "yes", "Yes", "No").astype(object)
+    rational["Length_Days"] = np.where(np.isnan(length_days), [f"https://archive.example.org/{i}" for i in no],
+                                       length_days.astype(object)).astype(object)
+    for col in ("State_response_accomendation", "Acceptance", "Advantage", "State_response_distraction",
+                "State_response_repression", "Physical_repression", "Legal_repression", "State_response_ignore",
+                "Ignore", "Attrition"):
+        rational[col] = np.where(codes[col] == "yes", justification, "no").astype(object)
+    rational["Outcome"] = justification
+    rational["Longterm"] = ["No identified long-term change."] * n
+    rational["Keywords_FACTIVA_for_daybyday_search"] = codes["Keywords_FACTIVA_for_daybyday_search"]
+    df_rational = pd.DataFrame(rational)
+    for col in ("Injuries_total", "Police_injuries", "Deaths_total", "Police_deaths", "Arrested", "Length_Days"):
+        df_rational[col] = df_rational[col].astype(object)
+
+    # What read_excel_frames() does after parsing: merge the first rationale Description per index
+    desc_map = dict(zip(df_rational['index'], df_rational['Description']))
+    df_codes['merged_description'] = df_codes['index'].map(desc_map).fillna("No rationale available.")
+    df_codes['Description'] = df_codes['merged_description']
+    return df_codes, df_rational
+
+
+def write_dataset(directory, n, dim=1536, seed=0, model=""):
+    """Snapshot + matching fake vector store in `directory` (used as the server's working directory)."""
+    import data_snapshot
+    import vector_store
+    from bench_ann import clustered_vectors
+    from embedding_pipeline import build_rich_texts, text_hash
+
+    df_codes, df_rational = generate_frames(n, seed)
+    snapshot_dir = os.path.join(directory, data_snapshot.SNAPSHOT_DIR)
+    codes_path = os.path.join(directory, data_snapshot.CODES_FILE)
+    rational_path = os.path.join(directory, data_snapshot.RATIONAL_FILE)
+    # No Excel files: the snapshot is keyed by the hash of the missing sources
+    digest = data_snapshot.source_hash([codes_path, rational_path])
+    data_snapshot.save_snapshot(df_codes, df_rational, digest, snapshot_dir)
+
+    ids, texts = build_rich_texts(df_codes, df_rational)
+    vectors, _ = clustered_vectors(len(ids), dim, max(8, int(np.sqrt(len(ids)))), np.random.default_rng(seed))
+    vector_store.write_store(vectors, ids, [text_hash(t) for t in texts], model, digest,
+                             os.path.join(directory, vector_store.STORE_DIR))
+    return df_codes, df_rational
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("out_dir")
+    parser.add_argument("--n", type=int, default=10_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    os.makedirs(args.out_dir, exist_ok=True)
+    df_codes, df_rational = write_dataset(args.out_dir, args.n, args.dim, args.seed)
+    print(f"Wrote {len(df_codes)} movements ({df_codes.shape[1]} + {df_rational.shape[1]} columns) to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import math
+import re
+import threading
+
+# --- Full-Database Chat Context ---
+# The pipe-separated movement table the chat endpoints paste into the prompt
+# when the whole database is needed. Built once per data version and format,
+# then served from memory.
+#
+#   csv:     the original layout, unchanged
+#   compact: numbers cleaned up ("2019.0" -> "2019"), repeated values of
+#            low-cardinality columns (region, category, outcome, ...) replaced
+#            by short codes with a legend at the top
+#
+# With a token budget the table is shrunk until it fits: shorter descriptions
+# first, then low-value columns are dropped, then the oldest rows.
+
+HEADER = ["ID", "Name", "Year", "Region", "Category", "Tweets", "Duration", "Reoccurrence",
+          "Impact", "Offline", "Participants", "Outcome", "Description"]
+# Dropped in this order when over budget; ID and Name always stay
+DROP_ORDER = ["Participants", "Duration", "Impact", "Offline", "Reoccurrence", "Description",
+              "Tweets", "Outcome", "Category", "Region", "Year"]
+DESCRIPTION_STEPS = (500, 250, 120)
+# Never dictionary-coded: unique per row or already short
+_UNCODED = {"ID", "Name", "Year", "Tweets", "Duration", "Description"}
+_MIN_CODED_LEN = 4
+_NUMBER_RE = re.compile(r"^-?\d+\.0$")
+
+_THEMES = [('Theme_political', 'Political'), ('Theme_economic', 'Economic'),
+           ('Theme_environmental', 'Environmental'), ('Theme_social', 'Social'), ('Theme_others', 'Other')]
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English text)."""
+    return math.ceil(len(text) / 4)
+
+
+def _column(df, col, default):
+    return df[col].tolist() if col in df.columns else [default] * len(df)
+
+
+def extract_rows(df_codes, sort=True):
+    """Table cells as strings, newest year first (or in the given order), formatted like the original builder."""
+    df = df_codes.sort_values(by='year', ascending=False) if sort else df_codes
+    themes = [(_column(df, col, None), tag) for col, tag in _THEMES]
+    columns = [
+        _column(df, 'index', ''),
+        [str(v).replace('|', '/') for v in _column(df, 'protest_name', 'Unknown')],
+        _column(df, 'year', 'Unknown'),
+        _column(df, 'area', 'Global'),
+        [",".join(tag for values, tag in themes if str(values[i]).lower() != 'no') for i in range(len(df))],
+        _column(df, '#tweets', '0'),
+        _column(df, 'Length_Days', 'Unknown'),
+        _column(df, 'Reoccurrence', 'No'),
+        _column(df, 'Twitter_Penetration', 'N/A'),
+        _column(df, 'Offline', 'No'),
+        [str(v).replace('|', '/') for v in _column(df, 'Key_Participants', 'General')],
+        [str(v).replace('|', '/') for v in _column(df, 'Outcome', 'Ongoing')],
+        [str(v).replace('\n', ' ').replace('|', '/') for v in _column(df, 'Description', '')],
+    ]
+    return [[str(v) for v in row] for row in zip(*columns)]
+
+
+def _clean(value):
+    if value in ("nan", "None", "NaT"):
+        return ""
+    return value[:-2] if _NUMBER_RE.match(value) else value
+
+
+def _dictionary(values, prefix):
+    """Codes for values worth coding in one column, or {} if coding would not pay off."""
+    counts = {}
+    for v in values:
+        counts[v] = counts.get(v, 0) + 1
+    candidates = sorted((v for v, n in counts.items() if n > 1 and len(v) >= _MIN_CODED_LEN),
+                        key=lambda v: (-counts[v], v))
+    codes = {v: f"{prefix}{i + 1}" for i, v in enumerate(candidates)}
+    # A raw value that looks like a code would be ambiguous
+    if codes and any(re.fullmatch(rf"{prefix}\d+", v) for v in counts):
+        return {}
+    saved = sum(counts[v] * (len(v) - len(c)) for v, c in codes.items())
+    legend = sum(len(v) + len(c) + 3 for v, c in codes.items())
+    return codes if saved > legend else {}
+
+
+def render(rows, fmt="csv", drop=(), description_chars=500, max_rows=None, title="FULL DATABASE"):
+    keep = [i for i, h in enumerate(HEADER) if h not in drop]
+    desc_col = HEADER.index("Description")
+    shown = rows if max_rows is None else rows[:max_rows]
+    table = []
+    for row in shown:
+        cells = list(row)
+        cells[desc_col] = cells[desc_col][:description_chars]
+        if fmt == "compact":
+            cells = [_clean(c) for c in cells]
+        table.append(cells)
+
+    lines = [f"--- {title} START ---"]
+    if fmt == "compact":
+        legend = []
+        for i in keep:
+            if HEADER[i] in _UNCODED:
+                continue
+            codes = _dictionary([cells[i] for cells in table], HEADER[i][0])
+            if codes:
+                legend.extend(f"{c}={v}" for v, c in codes.items())
+                for cells in table:
+                    cells[i] = codes.get(cells[i], cells[i])
+        if legend:
+            lines.append("Codes used in the table below: " + "; ".join(legend))
+    lines.append("|".join(HEADER[i] for i in keep))
+    lines.extend("|".join(cells[i] for i in keep) for cells in table)
+    if len(shown) < len(rows):
+        lines.append(f"... {len(rows) - len(shown)} more movements omitted to fit the context size")
+    lines.append(f"--- {title} END ---")
+    return "\n".join(lines) + "\n"
+
+
+def fit_to_budget(rows, fmt, max_tokens, title="FULL DATABASE"):
+    """Largest rendering of `rows` whose estimated token count is within max_tokens."""
+    attempts = [((), n) for n in DESCRIPTION_STEPS]
+    for k in range(1, len(DROP_ORDER) + 1):
+        attempts.append((tuple(DROP_ORDER[:k]), DESCRIPTION_STEPS[-1]))
+    for drop, chars in attempts:
+        text = render(rows, fmt, drop, chars, title=title)
+        if estimate_tokens(text) <= max_tokens:
+            return text
+    # Still too large with only ID and Name: keep the leading rows that fit
+    drop, chars = attempts[-1]
+    lo, hi = 0, len(rows)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(render(rows, fmt, drop, chars, max_rows=mid, title=title)) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return render(rows, fmt, drop, chars, max_rows=lo, title=title)
+
+
+def build_context(df_codes, fmt="csv", max_tokens=0):
+    if df_codes.empty:
+        return "Database is empty."
+    rows = extract_rows(df_codes)
+    if max_tokens and max_tokens > 0:
+        return fit_to_budget(rows, fmt, max_tokens)
+    return render(rows, fmt)
+
+
+def build_aggregates(df_codes, max_values=20):
+    """Movement counts per year, region, theme, outcome and regime over the whole table."""
+    if df_codes.empty:
+        return "Database is empty."
+    lines = [f"--- DATABASE AGGREGATES (all {len(df_codes)} movements) ---"]
+
+    def counts(label, values):
+        tally = {}
+        for v in values:
+            v = _clean(str(v)).strip()
+            if v:
+                tally[v] = tally.get(v, 0) + 1
+        ranked = sorted(tally.items(), key=lambda item: (-item[1], item[0]))
+        text = ", ".join(f"{v}: {n}" for v, n in ranked[:max_values])
+        if len(ranked) > max_values:
+            text += f", ... ({len(ranked) - max_values} more)"
+        lines.append(f"{label}: {text}")
+
+    if 'year' in df_codes.columns:
+        year_counts = {}
+        for v in df_codes['year'].tolist():
+            year = _clean(str(v))
+            if year:
+                year_counts[year] = year_counts.get(year, 0) + 1
+        lines.append("Movements by year: " + ", ".join(f"{y}: {n}" for y, n in sorted(year_counts.items(), reverse=True)))
+    for col, label in (('area', 'By region'), ('Outcome', 'By outcome'), ('Regime_Democracy', 'By regime')):
+        if col in df_codes.columns:
+            counts(label, df_codes[col].tolist())
+    themes = []
+    for col, tag in _THEMES:
+        if col in df_codes.columns:
+            themes.append(f"{tag}: {sum(1 for v in df_codes[col].tolist() if str(v).lower() != 'no')}")
+    if themes:
+        lines.append("By theme (a movement can have several): " + ", ".join(themes))
+    if '#tweets' in df_codes.columns:
+        total = 0.0
+        for v in df_codes['#tweets'].tolist():
+            try:
+                v = float(v)
+            except (TypeError, ValueError):
+                continue
+            if v == v:  # skip NaN
+                total += v
+        lines.append(f"Total tweets: {int(total)}")
+    lines.append("--- END AGGREGATES ---")
+    return "\n".join(lines) + "\n"
+
+
+class ContextCache:
+    """Rendered contexts keyed by (data version, kind, ...); older versions are dropped."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key, build):
+        with self._lock:
+            text = self._entries.get(key)
+        if text is None:
+            text = build()
+            with self._lock:
+                self._entries = {k: v for k, v in self._entries.items() if k[0] == key[0]}
+                self._entries[key] = text
+        return text
+
+    def get(self, df_codes, version, fmt="csv", max_tokens=0):
+        return self._cached((version, "table", fmt, max_tokens), lambda: build_context(df_codes, fmt, max_tokens))
+
+    def aggregates(self, df_codes, version):
+        return self._cached((version, "aggregates"), lambda: build_aggregates(df_codes))
@@ -0,0 +1,122 @@
+import re
+
+# --- Local Chat Router ---
+# Decides whether /api/chat_stream needs database context beyond the movements
+# on the user's screen, without an LLM round trip. Rules, in order:
+#
+#   1. explicit global scope ("in the database", "all movements")  -> YES
+#   2. refers to the visible list ("these", "shown", "above")     -> NO
+#   3. names a movement that is not on screen                      -> YES
+#   4. statistical / comparative intent ("how many", "most")       -> YES
+#   5. names only movements that are on screen                     -> NO
+#   6. small talk ("hi", "thanks")                                 -> NO
+#   7. nothing on screen                                           -> YES
+#   otherwise undecided (None): the caller may ask the remote router.
+
+_GLOBAL_RE = re.compile(
+    r"\b(database|dataset|all (the )?movements|every movement|entire|whole|overall|in total|globally|"
+    r"across (all|the))\b|数据库|全部|所有|总共",
+    re.IGNORECASE,
+)
+_SCREEN_RE = re.compile(
+    r"\b(these|those|this list|the list|shown|displayed|on (my|the) screen|visible|above|"
+    r"current (results?|list)|search results?|searched|results here)\b|这些|当前|显示",
+    re.IGNORECASE,
+)
+_STATS_RE = re.compile(
+    r"\b(how many|number of|count|total|average|mean|median|percent(age)?|proportion|share of|"
+    r"most|least|largest|biggest|smallest|highest|lowest|top \d+|rank(ing|ed)?|trend|over time|"
+    r"distribution|compare|comparison|statistics?|stats|per (year|region|country)|"
+    r"by (year|region|country|decade))\b|多少|统计|平均|最多|最少|比例|趋势",
+    re.IGNORECASE,
+)
+_SMALL_TALK_RE = re.compile(
+    r"^\s*(hi|hello|hey|thanks|thank you|ok(ay)?|cool|great|bye|good (morning|evening)|who are you|"
+    r"what can you do|你好|谢谢)\W*$",
+    re.IGNORECASE,
+)
+_HASHTAG_RE = re.compile(r"#\w+", re.UNICODE)
+_NAME_SUFFIX_RE = re.compile(r"\s+(movement|campaign|protests?|strikes?)$")
+_PAREN_RE = re.compile(r"\(([^)]*)\)")
+_MIN_NAME_LEN = 5
+
+YES, NO = True, False
+
+
+def _name_keys(name):
+    """Match keys for a name: the name without its parenthetical, and the parenthetical itself."""
+    text = str(name).lower().replace("\xa0", " ")
+    parts = [_PAREN_RE.sub(" ", text)] + _PAREN_RE.findall(text)
+    keys = []
+    for part in parts:
+        key = _NAME_SUFFIX_RE.sub("", " ".join(part.lstrip("# ").split()))
+        if len(key) >= _MIN_NAME_LEN:
+            keys.append(key)
+    return keys
+
+
+def build_name_index(df_codes, routing_index=None):
+    """How a query can name a movement, mapped to the protest_name(s) it refers to.
+
+    {"names": {normalized name: (protest_name, ...)}, "hashtags": {tag: (protest_name, ...)}}
+    Hashtags come from the routing index (routing_index.py) and are stored without '#'.
+    """
+    index = {"names": {}, "hashtags": {}}
+    if df_codes.empty or 'protest_name' not in df_codes.columns:
+        return index
+    display = df_codes['protest_name'].tolist()
+    names = {}
+    for col in ('protest_name', 'protest_name_v2'):
+        if col not in df_codes.columns:
+            continue
+        for shown, value in zip(display, df_codes[col].tolist()):
+            if isinstance(value, str) and isinstance(shown, str):
+                for key in _name_keys(value):
+                    names.setdefault(key, set()).add(shown)
+    index["names"] = {key: tuple(sorted(v)) for key, v in names.items()}
+    if routing_index is not None:
+        index["hashtags"] = {
+            tag: tuple(sorted({display[p] for p in positions if isinstance(display[p], str)}))
+            for tag, positions in routing_index["hashtags"].postings.items()
+        }
+    return index
+
+
+def mentioned_movements(query, name_index):
+    """Groups of protest_names the query refers to, one group per matched name or hashtag."""
+    text = " ".join(query.lower().split())
+    groups = [shown for key, shown in name_index["names"].items() if key in text]
+    for tag in _HASHTAG_RE.findall(text):
+        shown = name_index["hashtags"].get(tag[1:])
+        if shown:
+            groups.append(shown)
+    return groups
+
+
+def is_statistical(query):
+    """True for counting / comparison questions and questions about the whole database."""
+    return bool(_STATS_RE.search(query) or _GLOBAL_RE.search(query))
+
+
+def route(query, context_movements, name_index):
+    """(decision, reason): decision is YES, NO or None when the rules cannot tell."""
+    if _GLOBAL_RE.search(query):
+        return YES, "global scope"
+    if _SCREEN_RE.search(query):
+        return NO, "refers to visible results"
+
+    visible = " ".join(context_movements).lower()
+    mentioned = mentioned_movements(query, name_index)
+    for shown in mentioned:
+        if not any(name.lower() in visible for name in shown):
+            return YES, f"mentions '{shown[0]}' which is not on screen"
+
+    if _STATS_RE.search(query):
+        return YES, "statistical question"
+    if mentioned:
+        return NO, "asks about a visible movement"
+    if _SMALL_TALK_RE.match(query):
+        return NO, "small talk"
+    if not context_movements:
+        return YES, "nothing on screen"
+    return None, "undecided"
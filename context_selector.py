@@ -0,0 +1,90 @@
+import re
+
+import chat_context
+import chat_router
+from routing_index import YEAR_RE, lookup_hashtags, lookup_region, lookup_year
+
+# --- Retrieval-Augmented Chat Context ---
+# Instead of pasting the whole movement table into the prompt, pick the rows
+# that matter for this question:
+#
+#   1. exact hits from the smart-route indexes (movements named in the question,
+#      hashtags, years, regions), in that order
+#   2. the nearest movements by embedding (computed by the caller), or BM25
+#      matches when no query vector is available
+#
+# capped at `k` rows, plus the cached whole-database aggregates when the
+# question is statistical. The size is bounded by k and the token budget, not
+# by the number of movements.
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_HASHTAG_RE = re.compile(r"#\w+", re.UNICODE)
+_MIN_REGION_WORD = 4  # shorter region codes ("eu", "as") only match in upper case
+
+
+def mentioned_regions(query, routing_index):
+    regions = []
+    for word in _WORD_RE.findall(query):
+        key = word.lower()
+        if key in routing_index["regions"] and (len(key) >= _MIN_REGION_WORD or word.isupper()):
+            regions.append(key)
+    return regions
+
+
+def exact_hits(store, query):
+    """Row positions the question points at directly, with a note per filter for the prompt."""
+    routing = store.metadata_index
+    hits, notes = [], []
+
+    names = [name for shown in chat_router.mentioned_movements(query, store.chat_names) for name in shown]
+    if names:
+        wanted = set(names)
+        hits.extend(pos for pos, name in enumerate(store.df_codes['protest_name'].tolist()) if name in wanted)
+    if "#" in query:
+        positions = lookup_hashtags(routing, query)
+        hits.extend(positions.tolist())
+        tags = " ".join(_HASHTAG_RE.findall(query))
+        notes.append(f"movements with hashtags matching {tags}: {len(positions)}")
+    for year in dict.fromkeys(YEAR_RE.findall(query)):
+        positions = lookup_year(routing, year)
+        hits.extend(positions.tolist())
+        notes.append(f"movements in or mentioning {year}: {len(positions)}")
+    for region in dict.fromkeys(mentioned_regions(query, routing)):
+        positions = lookup_region(routing, region)
+        hits.extend(positions.tolist())
+        notes.append(f"movements in region {region.upper()}: {len(positions)}")
+    return hits, notes
+
+
+def select_positions(store, query, semantic_positions, k):
+    """Up to k distinct row positions: exact hits first, then semantic (or BM25) neighbours."""
+    hits, notes = exact_hits(store, query)
+    ranked = list(hits)
+    if semantic_positions:
+        ranked.extend(semantic_positions)
+    elif store.lexical_index is not None:
+        positions, _ = store.lexical_index.search(query, k=k)
+        ranked.extend(positions.tolist())
+    return list(dict.fromkeys(int(p) for p in ranked))[:k], notes
+
+
+def select_context(store, query, semantic_positions, k=25, fmt="compact", max_tokens=0, aggregates=None):
+    """Bounded database context for one chat question."""
+    if store.df_codes.empty:
+        return "Database is empty."
+    positions, notes = select_positions(store, query, semantic_positions, k)
+    parts = []
+    if aggregates is not None and chat_router.is_statistical(query):
+        parts.append(aggregates)
+        if notes:
+            parts.append("Exact counts for this question: " + "; ".join(notes) + "\n")
+    if positions:
+        rows = chat_context.extract_rows(store.df_codes.iloc[positions], sort=False)
+        title = f"MOST RELEVANT MOVEMENTS ({len(positions)} of {len(store.df_codes)})"
+        if max_tokens:
+            # The aggregates come out of the same budget
+            budget = max(1, max_tokens - sum(chat_context.estimate_tokens(p) for p in parts))
+            parts.append(chat_context.fit_to_budget(rows, fmt, budget, title))
+        else:
+            parts.append(chat_context.render(rows, fmt, title=title))
+    return "\n".join(parts)
@@ -0,0 +1,319 @@
+import pandas as pd
+import numpy as np
+import datetime
+import hashlib
+import os
+import sys
+import time
+
+# --- Compiled Dataset Snapshot ---
+# Parsing the two Excel workbooks through openpyxl (plus the ID normalization,
+# numeric coercion and rationale merge) dominates server startup. The build step
+# below runs that pipeline once and stores the finished frames as a columnar .npz
+# file keyed by the content hash of the source workbooks. At runtime the server
+# loads the snapshot directly and only re-parses Excel when the hash changes.
+#
+# Build step:  python data_snapshot.py
+
+CODES_FILE = 'Coding_LATEST_LH.xlsx'
+RATIONAL_FILE = 'CodingRational_LATEST.xlsx'
+SNAPSHOT_DIR = 'data_snapshots'
+
+# Bump whenever the on-disk layout or the preprocessing pipeline changes,
+# so stale snapshots are ignored even if the Excel files did not change.
+SNAPSHOT_FORMAT = 1
+
+# Per-cell type tags for mixed object columns (e.g. 'Injuries_total' holds both
+# numbers and free text), so the round trip preserves the original Python types.
+_TAG_NULL, _TAG_STR, _TAG_INT, _TAG_FLOAT, _TAG_BOOL, _TAG_TIMESTAMP, _TAG_DATETIME = range(7)
+
+
+def normalize_id(val):
+    """Normalize ID to string, removing trailing .0 if present"""
+    s = str(val).strip()
+    if s.endswith('.0'):
+        return s[:-2]
+    return s
+
+
+def source_hash(paths):
+    """SHA-256 over the snapshot format and the bytes of every existing source file."""
+    h = hashlib.sha256(f"format={SNAPSHOT_FORMAT}".encode())
+    for path in paths:
+        h.update(os.path.basename(path).encode())
+        if not os.path.exists(path):
+            h.update(b"<missing>")
+            continue
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+# --- Excel Pipeline (slow path) ---
+def read_excel_frames(codes_path=CODES_FILE, rational_path=RATIONAL_FILE):
+    """Parse both workbooks and apply ID normalization, numeric coercion and the Description merge."""
+    df_codes = pd.DataFrame()
+    df_rational = pd.DataFrame()
+
+    # Load Coding Data - ONLY 'Coding_clean'
+    if os.path.exists(codes_path):
+        try:
+            df_codes = pd.read_excel(codes_path, sheet_name='Coding_clean')
+            print(f"Loaded 'Coding_clean' sheet from {codes_path}")
+        except ValueError:
+            print("Sheet 'Coding_clean' not found, falling back to first sheet.")
+            df_codes = pd.read_excel(codes_path)
+
+        df_codes.columns = [c.strip() for c in df_codes.columns]
+
+        # Normalize Index - PREFER ORIGINAL 'index' COLUMN
+        if 'index' in df_codes.columns:
+            df_codes['index'] = df_codes['index'].astype(str).apply(normalize_id)
+        elif 'no' in df_codes.columns:
+            # Fallback if 'index' is missing
+            df_codes['index'] = df_codes['no'].astype(str).apply(normalize_id)
+        else:
+            # Create default index if missing
+            df_codes['index'] = df_codes.index.astype(str)
+
+        # --- Type Conversion for Analytics ---
+        # Ensure numeric columns are actually numeric for the Agent to calculate stats
+        numeric_cols = ['year', '#tweets', 'Length_Days']
+        for col in numeric_cols:
+            if col in df_codes.columns:
+                df_codes[col] = pd.to_numeric(df_codes[col], errors='coerce')
+
+    # Load Rationale Data - ONLY 'CodingRationale_clean'
+    if os.path.exists(rational_path):
+        try:
+            df_rational = pd.read_excel(rational_path, sheet_name='CodingRationale_clean')
+            print(f"Loaded 'CodingRationale_clean' sheet from {rational_path}")
+        except ValueError:
+            print("Sheet 'CodingRationale_clean' not found, trying 'CodingRationale'...")
+            try:
+                df_rational = pd.read_excel(rational_path, sheet_name='CodingRationale')
+            except ValueError:
+                df_rational = pd.read_excel(rational_path)
+
+        df_rational.columns = [c.strip() for c in df_rational.columns]
+
+        # Normalize Index for Rationale - PREFER ORIGINAL 'index' COLUMN
+        if 'index' in df_rational.columns:
+            df_rational['index'] = df_rational['index'].astype(str).apply(normalize_id)
+        elif 'no' in df_rational.columns:
+            df_rational['index'] = df_rational['no'].astype(str).apply(normalize_id)
+        else:
+            print("Warning: Rationale file has neither 'index' nor 'no' column!")
+
+        # --- MERGE DESCRIPTION INTO DF_CODES ---
+        # Since rows are aligned by 'no', we can just merge based on 'index'
+        if not df_codes.empty and not df_rational.empty:
+            print("Merging Rationale Description into Main Data...")
+
+            # We'll create a dictionary mapping index -> description
+            desc_map = dict(zip(df_rational['index'], df_rational['Description']))
+            df_codes['merged_description'] = df_codes['index'].map(desc_map)
+            df_codes['merged_description'] = df_codes['merged_description'].fillna("No rationale available.")
+
+            # CRITICAL: Also update the main 'Description' column for backward compatibility
+            # (e.g. for card summaries and embedding logic relying on row['Description'])
+            df_codes['Description'] = df_codes['merged_description']
+
+            print("Merge complete. Added 'merged_description' and updated 'Description' column.")
+
+    return df_codes, df_rational
+
+
+# --- Columnar Encoding ---
+def _encode_strings(values):
+    """Pack strings into one UTF-8 buffer plus an offsets array (Arrow-style layout)."""
+    encoded = [v.encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def _decode_strings(blob, offsets):
+    raw = blob.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def _cell_tag(v):
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return _TAG_NULL
+    if isinstance(v, str):
+        return _TAG_STR
+    if isinstance(v, (bool, np.bool_)):
+        return _TAG_BOOL
+    if isinstance(v, (int, np.integer)):
+        return _TAG_INT
+    if isinstance(v, (float, np.floating)):
+        return _TAG_FLOAT
+    if isinstance(v, (pd.Timestamp, np.datetime64)):
+        return _TAG_TIMESTAMP
+    if isinstance(v, datetime.datetime):
+        # openpyxl hands back plain datetimes for date cells in text columns
+        return _TAG_DATETIME
+    return _TAG_STR
+
+
+def _frame_to_arrays(df, prefix):
+    """Encode a DataFrame as a flat dict of numpy arrays (no pickled objects)."""
+    arrays = {
+        f"{prefix}.columns": np.array(list(df.columns), dtype=np.str_),
+        f"{prefix}.dtypes": np.array([str(t) for t in df.dtypes], dtype=np.str_),
+    }
+    for i, col in enumerate(df.columns):
+        key = f"{prefix}.{i}"
+        series = df[col]
+        kind = series.dtype.kind
+        if kind in 'biufM':
+            arrays[f"{key}.values"] = series.to_numpy()
+            continue
+        # Object / string column: tag every cell, store text in a packed buffer
+        cells = series.tolist()
+        tags = np.array([_cell_tag(v) for v in cells], dtype=np.int8)
+        texts = []
+        for v, t in zip(cells, tags):
+            if t == _TAG_NULL:
+                texts.append("")
+            elif t == _TAG_TIMESTAMP:
+                texts.append(pd.Timestamp(v).isoformat())
+            elif t == _TAG_DATETIME:
+                texts.append(v.isoformat())
+            elif t == _TAG_FLOAT:
+                texts.append(repr(float(v)))
+            else:
+                texts.append(str(v))
+        blob, offsets = _encode_strings(texts)
+        arrays[f"{key}.tags"] = tags
+        arrays[f"{key}.blob"] = blob
+        arrays[f"{key}.offsets"] = offsets
+    return arrays
+
+
+def _restore_cell(text, tag):
+    if tag == _TAG_NULL:
+        return np.nan
+    if tag == _TAG_INT:
+        return int(text)
+    if tag == _TAG_FLOAT:
+        return float(text)
+    if tag == _TAG_BOOL:
+        return text == 'True'
+    if tag == _TAG_TIMESTAMP:
+        return pd.Timestamp(text)
+    if tag == _TAG_DATETIME:
+        return datetime.datetime.fromisoformat(text)
+    return text
+
+
+def _arrays_to_frame(data, prefix):
+    columns = data[f"{prefix}.columns"].tolist()
+    dtypes = data[f"{prefix}.dtypes"].tolist()
+    out = {}
+    for i, (col, dtype) in enumerate(zip(columns, dtypes)):
+        key = f"{prefix}.{i}"
+        if f"{key}.values" in data:
+            out[col] = pd.Series(data[f"{key}.values"])
+            continue
+        tags = data[f"{key}.tags"]
+        texts = _decode_strings(data[f"{key}.blob"], data[f"{key}.offsets"])
+        values = [_restore_cell(t, tag) for t, tag in zip(texts, tags)]
+        series = pd.Series(values, dtype=object)
+        if dtype != 'object':
+            try:
+                series = series.astype(dtype)
+            except (TypeError, ValueError):
+                pass
+        out[col] = series
+    return pd.DataFrame(out, columns=columns)
+
+
+# --- Snapshot Files ---
+def snapshot_path(digest, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"snapshot_{digest[:16]}.npz")
+
+
+def save_snapshot(df_codes, df_rational, digest, snapshot_dir=SNAPSHOT_DIR):
+    """Write the compiled frames atomically and prune snapshots of older source versions."""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    arrays = {"digest": np.array(digest), "format": np.array(SNAPSHOT_FORMAT)}
+    arrays.update(_frame_to_arrays(df_codes, "codes"))
+    arrays.update(_frame_to_arrays(df_rational, "rational"))
+
+    path = snapshot_path(digest, snapshot_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+    for name in os.listdir(snapshot_dir):
+        old = os.path.join(snapshot_dir, name)
+        if name.startswith("snapshot_") and name.endswith(".npz") and old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return path
+
+
+def load_snapshot(digest, snapshot_dir=SNAPSHOT_DIR):
+    """Return (df_codes, df_rational) from the snapshot for `digest`, or None if absent/stale."""
+    path = snapshot_path(digest, snapshot_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["digest"]) != digest or int(data["format"]) != SNAPSHOT_FORMAT:
+                return None
+            return _arrays_to_frame(data, "codes"), _arrays_to_frame(data, "rational")
+    except Exception as e:
+        print(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+
+
+def load_frames(codes_path=CODES_FILE, rational_path=RATIONAL_FILE, snapshot_dir=SNAPSHOT_DIR):
+    """Load the coding frames from the compiled snapshot, falling back to Excel on a hash miss.
+
+    Returns (df_codes, df_rational, digest). A fresh snapshot is written after an
+    Excel fallback so the next start (or the next worker) takes the fast path.
+    """
+    digest = source_hash([codes_path, rational_path])
+    frames = load_snapshot(digest, snapshot_dir)
+    if frames is not None:
+        print(f"Loaded dataset snapshot {digest[:16]}.")
+        return frames[0], frames[1], digest
+
+    print("No snapshot for current source files. Parsing Excel...")
+    df_codes, df_rational = read_excel_frames(codes_path, rational_path)
+    if not df_codes.empty or not df_rational.empty:
+        try:
+            path = save_snapshot(df_codes, df_rational, digest, snapshot_dir)
+            print(f"Wrote dataset snapshot {path}")
+        except OSError as e:
+            # Read-only deploys still work, they just keep paying the Excel cost
+            print(f"Could not write dataset snapshot: {e}")
+    return df_codes, df_rational, digest
+
+
+def build_snapshot(codes_path=CODES_FILE, rational_path=RATIONAL_FILE, snapshot_dir=SNAPSHOT_DIR):
+    """Build step: compile the Excel sources into a snapshot unconditionally."""
+    digest = source_hash([codes_path, rational_path])
+    start = time.perf_counter()
+    df_codes, df_rational = read_excel_frames(codes_path, rational_path)
+    path = save_snapshot(df_codes, df_rational, digest, snapshot_dir)
+    print(f"Compiled {len(df_codes)} coding rows and {len(df_rational)} rationale rows "
+          f"into {path} in {time.perf_counter() - start:.2f}s")
+    return path
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) not in (0, 2):
+        print("Usage: python data_snapshot.py [CODING_XLSX RATIONALE_XLSX]")
+        sys.exit(1)
+    build_snapshot(*args)
@@ -0,0 +1,169 @@
+import numpy as np
+import hashlib
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# --- Batched Embedding Pipeline ---
+# Builds the per-movement "rich text" in one pass over the frames, then sends it
+# to the embeddings API in large batches on a bounded thread pool. Each finished
+# batch is checkpointed to disk, so an interrupted run resumes where it stopped.
+
+CHECKPOINT_DIR = "embeddings_checkpoint"
+BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "128"))
+MAX_WORKERS = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+MAX_RETRIES = 5
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _column(df, name, default=''):
+    """Column values as a list, or `default` repeated when the column is absent."""
+    if name in df.columns:
+        return df[name].tolist()
+    return [default] * len(df)
+
+
+def build_rich_texts(df_codes, df_rational):
+    """Return (ids, texts) for every movement in df_codes.
+
+    Format: "Movement: ... Description: ... Theme: ... Query: ... Article: ... Keywords: ..."
+    The Description comes from the first matching row of the Rationale table.
+    """
+    if df_codes.empty:
+        return [], []
+
+    # One lookup table instead of filtering df_rational per row
+    desc_map = {}
+    if not df_rational.empty and 'index' in df_rational.columns:
+        descriptions = _column(df_rational, 'Description')
+        for idx, desc in zip(df_rational['index'].tolist(), descriptions):
+            desc_map.setdefault(idx, str(desc))
+
+    ids = [str(v) for v in _column(df_codes, 'index')]
+    texts = []
+    for idx, name, theme, query_val, article, keywords in zip(
+        ids,
+        _column(df_codes, 'protest_name'),
+        _column(df_codes, 'Theme_social'),
+        _column(df_codes, 'query'),
+        _column(df_codes, 'Article_Title'),
+        _column(df_codes, 'keywords_processed'),
+    ):
+        desc = desc_map.get(idx, "")
+        texts.append(f"Movement: {name}. Description: {desc}. Theme: {theme}. Query: {query_val}. Article: {article}. Keywords: {keywords}.")
+    return ids, texts
+
+
+# --- Checkpoints ---
+def _batch_file(checkpoint_dir, model, hashes):
+    digest = hashlib.sha256((model + "\n" + "\n".join(hashes)).encode()).hexdigest()[:20]
+    return os.path.join(checkpoint_dir, f"batch_{digest}.npz")
+
+
+def load_checkpoints(checkpoint_dir, model):
+    """Map text hash -> vector for every batch already embedded with `model`."""
+    done = {}
+    if not os.path.isdir(checkpoint_dir):
+        return done
+    for name in os.listdir(checkpoint_dir):
+        if not (name.startswith("batch_") and name.endswith(".npz")):
+            continue
+        try:
+            with np.load(os.path.join(checkpoint_dir, name), allow_pickle=False) as data:
+                if str(data["model"]) != model:
+                    continue
+                for h, vec in zip(data["hashes"].tolist(), data["vectors"]):
+                    done[h] = vec
+        except Exception as e:
+            print(f"Skipping unreadable checkpoint {name}: {e}")
+    return done
+
+
+def _save_checkpoint(checkpoint_dir, model, hashes, vectors):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    path = _batch_file(checkpoint_dir, model, hashes)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, model=np.array(model), hashes=np.array(hashes, dtype=np.str_), vectors=vectors)
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoints(checkpoint_dir=CHECKPOINT_DIR):
+    if not os.path.isdir(checkpoint_dir):
+        return
+    for name in os.listdir(checkpoint_dir):
+        if name.startswith("batch_"):
+            os.remove(os.path.join(checkpoint_dir, name))
+    try:
+        os.rmdir(checkpoint_dir)
+    except OSError:
+        pass
+
+
+# --- API Calls ---
+def _embed_batch(client, model, texts, max_retries=MAX_RETRIES):
+    """One embeddings request with exponential backoff + jitter. Returns float32 (B, D)."""
+    delay = 1.0
+    for attempt in range(max_retries + 1):
+        try:
+            res = client.embeddings.create(input=texts, model=model)
+            # The API may return items out of order; 'index' is authoritative
+            data = sorted(res.data, key=lambda d: d.index)
+            return np.array([d.embedding for d in data], dtype=np.float32)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            wait = delay * (1 + random.random())
+            print(f"Embedding batch failed ({e}). Retrying in {wait:.1f}s...")
+            time.sleep(wait)
+            delay = min(delay * 2, 60.0)
+
+
+def embed_texts(client, model, texts, batch_size=BATCH_SIZE, max_workers=MAX_WORKERS,
+                checkpoint_dir=CHECKPOINT_DIR):
+    """Embed `texts` and return a list of float32 vectors (None where a batch ultimately failed).
+
+    Texts already present in the checkpoint directory (same content hash, same
+    model) are not sent again, so re-running after a crash only embeds the rest.
+    """
+    hashes = [text_hash(t) for t in texts]
+    done = load_checkpoints(checkpoint_dir, model)
+    if done:
+        print(f"Resuming from checkpoint: {sum(h in done for h in hashes)}/{len(texts)} already embedded.")
+
+    # Deduplicate identical texts and skip anything already checkpointed
+    pending, seen = [], set()
+    for h, t in zip(hashes, texts):
+        if h not in done and h not in seen:
+            seen.add(h)
+            pending.append((h, t))
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    if batches:
+        print(f"Embedding {len(pending)} texts in {len(batches)} batches ({max_workers} concurrent)...")
+
+    finished = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {
+            pool.submit(_embed_batch, client, model, [t for _, t in batch]): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            batch_hashes = [h for h, _ in batch]
+            try:
+                vectors = future.result()
+            except Exception as e:
+                print(f"Giving up on batch of {len(batch)} texts: {e}")
+                continue
+            _save_checkpoint(checkpoint_dir, model, batch_hashes, vectors)
+            for h, vec in zip(batch_hashes, vectors):
+                done[h] = vec
+            finished += 1
+            print(f"  batch {finished}/{len(batches)} done")
+
+    return [done.get(h) for h in hashes]
@@ -0,0 +1,108 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# --- Facet Bitmaps ---
+# One packed bitmap (1 bit per df_codes row, np.packbits) per value of every
+# facet column, built once per data version. A filter is evaluated as
+#
+#   AND over facets ( OR over the selected values of that facet )
+#
+# and the per-value counts come out of the same bitmaps by popcount: each value
+# is counted against the selection of all *other* facets, so the counts say how
+# many results picking that value would give.
+
+FACET_COLUMNS = ("year", "area", "Regime_Democracy", "Outcome", "Offline")
+FACET_PREFIXES = ("Theme_", "State_response_")
+UNKNOWN = "unknown"
+# Set bits per byte value: popcount without np.bitwise_count (NumPy >= 2.0 only)
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int64)
+
+
+def facet_columns(df_codes):
+    cols = [c for c in FACET_COLUMNS if c in df_codes.columns]
+    cols += [c for c in df_codes.columns if c.startswith(FACET_PREFIXES)]
+    return cols
+
+
+def _values(series, year=False):
+    if year:
+        years = pd.to_numeric(series, errors='coerce')
+        return [UNKNOWN if pd.isna(v) else str(int(v)) for v in years.tolist()]
+    values = [UNKNOWN if pd.isna(v) or str(v).strip() == "" else str(v).strip() for v in series.tolist()]
+    # Values are selected case-insensitively, so "Yes" and "yes" are one value,
+    # spelled as it most often is in the data
+    spelling = {UNKNOWN: UNKNOWN}
+    for value, _ in Counter(values).most_common():
+        spelling.setdefault(value.lower(), value)
+    return [spelling[v.lower()] for v in values]
+
+
+class FacetIndex:
+    def __init__(self, n_rows, facets):
+        # facets: {column: (values, (V, ceil(n_rows / 8)) uint8 packed bitmaps)}
+        self.n_rows = n_rows
+        self.facets = facets
+        self._lookup = {col: {v.lower(): i for i, v in enumerate(values)} for col, (values, _) in facets.items()}
+        self._all = np.packbits(np.ones(n_rows, dtype=bool))
+
+    @classmethod
+    def build(cls, df_codes):
+        facets = {}
+        for col in facet_columns(df_codes):
+            values = _values(df_codes[col], year=(col == "year"))
+            order = sorted(set(values) - {UNKNOWN}) + ([UNKNOWN] if UNKNOWN in values else [])
+            codes = pd.Categorical(values, categories=order).codes
+            bits = codes[None, :] == np.arange(len(order))[:, None]
+            facets[col] = (order, np.packbits(bits, axis=1))
+        return cls(len(df_codes), facets)
+
+    def __contains__(self, facet):
+        return facet in self.facets
+
+    def known(self, facet, values):
+        """The `values` this facet has (case-insensitive); empty for an unknown facet."""
+        lookup = self._lookup.get(facet, {})
+        return [v for v in values if v.strip().lower() in lookup]
+
+    def select(self, facet, values):
+        """OR of the bitmaps of `values` in one facet (case-insensitive); ValueError for unknown ones."""
+        if facet not in self.facets:
+            raise ValueError(f"Unknown facet: {facet}")
+        lookup = self._lookup[facet]
+        missing = [v for v in values if v.strip().lower() not in lookup]
+        if missing:
+            raise ValueError(f"Unknown value(s) for {facet}: {', '.join(missing)}")
+        rows = [lookup[v.strip().lower()] for v in values]
+        return np.bitwise_or.reduce(self.facets[facet][1][rows], axis=0)
+
+    def select_years(self, first=None, last=None):
+        """OR of the year bitmaps within [first, last] (either end open)."""
+        values, bitmaps = self.facets.get("year", ([], None))
+        rows = [i for i, v in enumerate(values) if v != UNKNOWN
+                and (first is None or int(v) >= first) and (last is None or int(v) <= last)]
+        if not rows:
+            return np.zeros_like(self._all)
+        return np.bitwise_or.reduce(bitmaps[rows], axis=0)
+
+    def evaluate(self, selection):
+        """(row mask, per-facet value counts) for {facet: bitmap} as returned by select()."""
+        selected = list(selection.items())
+        # others[i] = AND of every selected facet but the i-th (prefix/suffix products)
+        prefix = [self._all]
+        for _, bits in selected:
+            prefix.append(prefix[-1] & bits)
+        suffix = [self._all]
+        for _, bits in reversed(selected):
+            suffix.append(suffix[-1] & bits)
+        suffix.reverse()
+        others = {facet: prefix[i] & suffix[i + 1] for i, (facet, _) in enumerate(selected)}
+        combined = prefix[-1]
+
+        counts = {}
+        for facet, (values, bitmaps) in self.facets.items():
+            n = _POPCOUNT[bitmaps & others.get(facet, combined)].sum(axis=1)
+            counts[facet] = {v: int(c) for v, c in zip(values, n)}
+        mask = np.unpackbits(combined, count=self.n_rows).astype(bool)
+        return mask, counts
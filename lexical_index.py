@@ -0,0 +1,108 @@
+import numpy as np
+import re
+from collections import Counter, defaultdict
+
+# --- BM25 Lexical Index ---
+# Offline keyword retrieval for when embeddings or the API key are unavailable.
+# Each posting stores its full BM25 term weight (idf * saturated tf with length
+# normalization), computed once at build time, so a query is just a sum of
+# precomputed weights over the postings of its terms.
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# CJK has no spaces: index character unigrams and bigrams instead of words
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+")
+
+
+def tokenize(text):
+    text = str(text).lower()
+    tokens = []
+    for word in _WORD_RE.findall(_CJK_RE.sub(" ", text)):
+        tokens.append(word)
+    for run in _CJK_RE.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, postings, n_docs):
+        self.postings = postings  # term -> (doc positions int32, weights float32)
+        self.n_docs = n_docs
+
+    @classmethod
+    def build(cls, docs, k1=1.5, b=0.75):
+        """Index a list of document strings; doc i is row position i."""
+        n = len(docs)
+        term_docs = defaultdict(list)
+        term_tfs = defaultdict(list)
+        lengths = np.zeros(n, dtype=np.float32)
+        for pos, doc in enumerate(docs):
+            counts = Counter(tokenize(doc))
+            lengths[pos] = sum(counts.values())
+            for term, tf in counts.items():
+                term_docs[term].append(pos)
+                term_tfs[term].append(tf)
+
+        avgdl = float(lengths.mean()) if n and lengths.mean() > 0 else 1.0
+        norm = k1 * (1 - b + b * lengths / avgdl)
+        postings = {}
+        for term, positions in term_docs.items():
+            positions = np.array(positions, dtype=np.int32)
+            tf = np.array(term_tfs[term], dtype=np.float32)
+            df = len(positions)
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            weights = idf * tf * (k1 + 1) / (tf + norm[positions])
+            postings[term] = (positions, weights.astype(np.float32))
+        return cls(postings, n)
+
+    def search(self, query, k=20, with_total=False):
+        """Return (positions, scores) of the best-matching docs, best first.
+
+        with_total adds the number of docs matching any query term.
+        """
+        scores = None
+        for term in set(tokenize(query)):
+            hit = self.postings.get(term)
+            if hit is None:
+                continue
+            if scores is None:
+                scores = np.zeros(self.n_docs, dtype=np.float32)
+            scores[hit[0]] += hit[1]
+        if scores is None:
+            empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+            return empty + (0,) if with_total else empty
+        matched = np.flatnonzero(scores > 0)
+        total = len(matched)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        # Best first; ties keep table order
+        matched = matched[np.lexsort((matched, -scores[matched]))]
+        if with_total:
+            return matched, scores[matched], total
+        return matched, scores[matched]
+
+
+# Columns searched by the keyword fallback (same as the old substring scan)
+SEARCH_COLS = ['protest_name', 'Description', 'Theme_social', 'protest_name_v2', 'query', 'Keywords_FACTIVA_for_daybyday_search', 'Article_Title']
+
+
+def build_documents(df_codes, df_rational):
+    """One text per df_codes row: SEARCH_COLS plus every text column of its rationale row."""
+    if df_codes.empty:
+        return []
+    valid_cols = [c for c in SEARCH_COLS if c in df_codes.columns]
+    parts = [df_codes[c].tolist() for c in valid_cols]
+
+    rationale_text = {}
+    if not df_rational.empty and 'index' in df_rational.columns:
+        text_cols = [c for c in df_rational.columns if c not in ('index', 'no') and df_rational[c].dtype.kind not in 'biufM']
+        for idx, *values in zip(df_rational['index'].tolist(), *[df_rational[c].tolist() for c in text_cols]):
+            if idx not in rationale_text:
+                rationale_text[idx] = " ".join(str(v) for v in values if isinstance(v, str))
+
+    docs = []
+    for pos, idx in enumerate(df_codes['index'].tolist()):
+        fields = [str(p[pos]) for p in parts if isinstance(p[pos], str)]
+        fields.append(rationale_text.get(idx, ""))
+        docs.append(" ".join(fields))
+    return docs
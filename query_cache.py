@@ -0,0 +1,232 @@
+import asyncio
+import numpy as np
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# --- Two-Tier Query Cache ---
+# Tier 1: bounded in-process LRU (microseconds, per worker).
+# Tier 2: a local SQLite file shared by all workers on the machine, with a TTL
+#         and size-based eviction of the least recently used entries.
+# Values are raw bytes; typed wrappers (e.g. QueryEmbeddingCache) encode/decode.
+# Async callers use aget/aput: the LRU is checked on the event loop and only the
+# SQLite tier (blocking I/O, up to a 5 s busy wait) runs in a worker thread.
+
+CACHE_DB = os.environ.get("QUERY_CACHE_DB", "query_cache.sqlite3")
+LRU_SIZE = int(os.environ.get("QUERY_CACHE_LRU_SIZE", "1024"))
+MAX_BYTES = int(os.environ.get("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TTL_SECONDS = float(os.environ.get("QUERY_CACHE_TTL", str(30 * 24 * 3600)))
+
+
+def normalize_text(text):
+    """Cache key form of a query: NFKC, lower-case, collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+class LRUCache:
+    def __init__(self, max_items=LRU_SIZE):
+        self.max_items = max_items
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """Key/value blobs in one SQLite file, namespaced so several caches can share it."""
+
+    _EVICT_EVERY = 64  # puts between size checks
+
+    def __init__(self, path=CACHE_DB, max_bytes=MAX_BYTES, ttl=TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        self._puts = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " ns TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (ns, key))"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+
+    def _conn(self):
+        # sqlite3 connections are not shareable across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, ns, key):
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT value, created FROM cache WHERE ns = ? AND key = ?", (ns, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, created = row
+        if self.ttl and now - created > self.ttl:
+            self._conn().execute("DELETE FROM cache WHERE ns = ? AND key = ?", (ns, key))
+            return None
+        self._conn().execute("UPDATE cache SET accessed = ? WHERE ns = ? AND key = ?", (now, ns, key))
+        return value
+
+    def put(self, ns, key, value):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache (ns, key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+            (ns, key, value, len(value) + len(key), now, now),
+        )
+        with self._lock:
+            self._puts += 1
+            check = self._puts % self._EVICT_EVERY == 0
+        if check:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        conn = self._conn()
+        if self.ttl:
+            conn.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk oldest-first, freeing a bit below the limit so we don't evict on every put
+        target = total - int(self.max_bytes * 0.9)
+        freed, victims = 0, []
+        for ns, key, size in conn.execute("SELECT ns, key, size FROM cache ORDER BY accessed"):
+            victims.append((ns, key))
+            freed += size
+            if freed >= target:
+                break
+        conn.executemany("DELETE FROM cache WHERE ns = ? AND key = ?", victims)
+        self.evictions += len(victims)
+
+    def size_bytes(self):
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+
+class TwoTierCache:
+    """LRU in front of a shared SQLiteCache namespace, with hit/miss counters."""
+
+    def __init__(self, namespace, disk=None, lru_size=LRU_SIZE):
+        self.namespace = namespace
+        self.lru = LRUCache(lru_size)
+        self.disk = disk
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _memory_get(self, key):
+        value = self.lru.get(key)
+        if value is not None:
+            self.memory_hits += 1
+        return value
+
+    def _disk_get(self, key):
+        value = None
+        if self.disk is not None:
+            try:
+                value = self.disk.get(self.namespace, key)
+            except sqlite3.Error as e:
+                print(f"Query cache read failed: {e}")
+        if value is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        self.lru.put(key, value)
+        return value
+
+    def _disk_put(self, key, value):
+        try:
+            self.disk.put(self.namespace, key, value)
+        except sqlite3.Error as e:
+            print(f"Query cache write failed: {e}")
+
+    def get_bytes(self, key):
+        value = self._memory_get(key)
+        return value if value is not None else self._disk_get(key)
+
+    def put_bytes(self, key, value):
+        self.lru.put(key, value)
+        if self.disk is not None:
+            self._disk_put(key, value)
+
+    async def aget_bytes(self, key):
+        """get_bytes for async handlers: a memory miss reads the disk tier off the event loop."""
+        value = self._memory_get(key)
+        if value is not None or self.disk is None:
+            return value if value is not None else self._disk_get(key)
+        return await asyncio.to_thread(self._disk_get, key)
+
+    async def aput_bytes(self, key, value):
+        self.lru.put(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self._disk_put, key, value)
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_items": len(self.lru),
+        }
+
+
+class QueryEmbeddingCache(TwoTierCache):
+    """Query vectors keyed by (model, normalized query text), stored as float32 bytes."""
+
+    def __init__(self, disk=None, lru_size=LRU_SIZE):
+        super().__init__("embedding", disk, lru_size)
+
+    @staticmethod
+    def key(text, model):
+        return f"{model}\x00{normalize_text(text)}"
+
+    def get(self, text, model):
+        value = self.get_bytes(self.key(text, model))
+        return None if value is None else np.frombuffer(value, dtype=np.float32)
+
+    def put(self, text, model, vector):
+        self.put_bytes(self.key(text, model), np.asarray(vector, dtype=np.float32).tobytes())
+
+    async def aget(self, text, model):
+        value = await self.aget_bytes(self.key(text, model))
+        return None if value is None else np.frombuffer(value, dtype=np.float32)
+
+    async def aput(self, text, model, vector):
+        await self.aput_bytes(self.key(text, model), np.asarray(vector, dtype=np.float32).tobytes())
+
+
+def open_disk_cache(path=CACHE_DB):
+    """Shared SQLite tier, or None (memory-only) if the file cannot be opened."""
+    try:
+        return SQLiteCache(path)
+    except sqlite3.Error as e:
+        print(f"Query cache disk tier disabled: {e}")
+        return None
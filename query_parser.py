@@ -0,0 +1,123 @@
+import re
+
+from analytics import THEMES
+
+# --- Structured Constraints in Search Queries ---
+# Pulls year, region, theme and regime constraints out of a free-text query so
+# hybrid search can filter with the facet bitmaps (facet_index.py) and score
+# only the remaining words semantically:
+#
+#   "student protests against authoritarian regime in Asia after 2018"
+#     -> text "student protests against", year_from 2019, area AS,
+#        Regime_Democracy authoritarian
+#
+# Patterns are deliberately narrow: a word is only taken as a constraint when
+# the phrasing makes that unambiguous ("environmental protests", "in Asia"),
+# never for names such as "Global Climate Movement".
+
+_Y = r"(?<!\d)((?:19|20)\d{2})(?!\d)"
+_YEAR_PATTERNS = [
+    # (pattern, function of the match -> (year_from, year_to))
+    (re.compile(rf"\b(?:between|from)\s+{_Y}\s+(?:and|to|until)\s+{_Y}", re.I), lambda m: (int(m[1]), int(m[2]))),
+    (re.compile(rf"{_Y}\s*(?:-|–|—|to|until)\s*{_Y}", re.I), lambda m: (int(m[1]), int(m[2]))),
+    (re.compile(rf"(?<!\d)((?:19|20)\d)0s\b", re.I), lambda m: (int(m[1]) * 10, int(m[1]) * 10 + 9)),
+    (re.compile(rf"\b(?:after|post)\s+{_Y}|{_Y}\s*年?以后", re.I), lambda m: (int(m[1] or m[2]) + 1, None)),
+    (re.compile(rf"\b(?:since|from)\s+{_Y}", re.I), lambda m: (int(m[1]), None)),
+    (re.compile(rf"\b(?:before|pre|prior to)\s+{_Y}|{_Y}\s*年?以前", re.I), lambda m: (None, int(m[1] or m[2]) - 1)),
+    (re.compile(rf"\b(?:until|through|up to)\s+{_Y}", re.I), lambda m: (None, int(m[1]))),
+    (re.compile(rf"(?:\b(?:in|during|of)\s+)?{_Y}年?", re.I), lambda m: (int(m[1]), int(m[1]))),
+]
+# A region is only a constraint after "in"/"across" ("protests in Europe") or
+# when it is the whole query: as an adjective it is usually part of a name
+# ("European Anti-Austerity Movement", "Stop Asian Hate").
+_REGION_PATTERNS = [
+    (re.compile(r"\b(?:in|across)\s+(?:the\s+)?(?:south|latin)\s+america\b", re.I), "SA"),
+    (re.compile(r"\b(?:in|across)\s+asia\b|亚洲", re.I), "AS"),
+    (re.compile(r"\b(?:in|across)\s+europe\b|欧洲", re.I), "EU"),
+    (re.compile(r"\b(?:in|across)\s+africa\b|非洲", re.I), "AF"),
+    (re.compile(r"\b(?:in|across)\s+(?:oceania|australia)\b", re.I), "OA"),
+    # Region codes only in upper case ("EU", not "eu" or "as")
+    (re.compile(r"\b(?:in|across)\s+(EU|AS|AF|SA|OA)\b"), None),
+]
+_REGION_ONLY = [
+    (re.compile(r"(?:south|latin)\s+american?", re.I), "SA"),
+    (re.compile(r"asian?", re.I), "AS"),
+    (re.compile(r"europe(?:an)?", re.I), "EU"),
+    (re.compile(r"african?", re.I), "AF"),
+    (re.compile(r"oceania|australian?", re.I), "OA"),
+    (re.compile(r"(EU|AS|AF|SA|OA)"), None),
+]
+# A theme adjective is a constraint with the noun it qualifies ("environmental
+# protests", both words are consumed) or when it is all that is left of the query
+# ("environmental in Europe")
+_THEME_RE = re.compile(r"\b(political|economic|environmental|social)\s+(?:protests?|movements?|issues?|campaigns?|themes?)\b", re.I)
+_THEME_ONLY = re.compile(r"(political|economic|environmental|social)", re.I)
+_REGIME_PATTERNS = [
+    (re.compile(r"\b(?:under\s+|in\s+)?(?:an?\s+)?semi-?democra(?:tic|cy|cies)\s*(?:regimes?|countries|states|governments?)?", re.I), "semi-democracy"),
+    (re.compile(r"\b(?:under\s+|in\s+)?(?:an?\s+)?(?:the\s+)?(?:authoritarian|autocratic)\s+(?:regimes?|countries|states|governments?|rule)\b", re.I), "authoritarian"),
+    (re.compile(r"\bin\s+(?:authoritarian\s+states|autocracies|dictatorships)\b", re.I), "authoritarian"),
+    (re.compile(r"\b(?:in\s+)?(?:democratic\s+(?:countries|states|regimes?|governments?)|democracies)\b", re.I), "democracy"),
+]
+# Left over after the constraints are removed, these alone do not make a semantic query
+_FILLER = {"in", "on", "of", "the", "a", "an", "and", "or", "at", "for", "from", "with", "during", "after",
+           "before", "since", "between", "to", "by", "all", "any", "show", "me", "list", "find",
+           "protest", "protests", "movement", "movements", "campaign", "campaigns", "year", "years", "年"}
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _cut(text, span):
+    return text[:span[0]] + " " + text[span[1]:]
+
+
+def parse_constraints(query):
+    """(remaining text, constraints) for a search query.
+
+    constraints: {"year_from": int, "year_to": int, facet column: [values]} with
+    only the keys that were found (facet columns as in facet_index.py).
+    """
+    text, found = query, {}
+    for pattern, years in _YEAR_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            first, last = years(match)
+            if first is not None:
+                found["year_from"] = first
+            if last is not None:
+                found["year_to"] = last
+            text = _cut(text, match.span())
+            break
+
+    areas = []
+    for pattern, code in _REGION_ONLY:
+        match = pattern.fullmatch(text.strip())
+        if match:
+            areas.append(code or match[1])
+            text = ""
+    for pattern, code in _REGION_PATTERNS:
+        for match in list(pattern.finditer(text))[::-1]:
+            areas.append(code or match[1])
+            text = _cut(text, match.span())
+    if areas:
+        found["area"] = list(dict.fromkeys(areas))
+
+    for match in list(_THEME_RE.finditer(text))[::-1]:
+        found.setdefault(THEMES[match[1].lower()], ["yes"])
+        text = _cut(text, match.span())
+    match = _THEME_ONLY.fullmatch(text.strip())
+    if match:
+        found.setdefault(THEMES[match[1].lower()], ["yes"])
+        text = ""
+
+    for pattern, regime in _REGIME_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            found["Regime_Democracy"] = [regime]
+            text = _cut(text, match.span())
+            break
+
+    return " ".join(text.split()), found
+
+
+def is_semantic(text):
+    """Whether the words left after removing constraints still say what to look for."""
+    return any(w.lower() not in _FILLER for w in _WORD_RE.findall(text))
@@ -0,0 +1,70 @@
+import numpy as np
+
+# --- Similarity Kernel ---
+# The vector store (vector_store.py) holds float32 rows that are already
+# L2-normalized, so cosine similarity is a single matrix-vector product against
+# the normalized query. Top-k selection uses argpartition (O(N)) and only sorts
+# the k survivors, instead of a full argsort over the corpus.
+
+
+def normalize_query(query):
+    q = np.asarray(query, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(q)
+    return q / norm if norm > 0 else q
+
+
+def select_top_k(scores, k, threshold):
+    """Indices of the top-k scores (descending), dropping anything below threshold."""
+    n = scores.shape[0]
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(n)
+    # Stable ordering for equal scores: lower row number first
+    idx = idx[np.lexsort((idx, -scores[idx]))]
+    if threshold is not None:
+        idx = idx[scores[idx] >= threshold]
+    return idx
+
+
+def count_matches(scores, threshold):
+    """Number of scored rows that pass the threshold (all of them without one)."""
+    return int(scores.shape[0]) if threshold is None else int(np.count_nonzero(scores >= threshold))
+
+
+def top_k(matrix, query, k=20, threshold=None, with_total=False, rows=None):
+    """Score one query against a pre-normalized (N, D) matrix.
+
+    Returns (indices, scores) for at most k rows, best first, plus the number of
+    rows above threshold when with_total is set. With `rows` (indices into matrix,
+    e.g. from a facet filter) only that subset is gathered and scored.
+    """
+    q = normalize_query(query)
+    if rows is None:
+        scores = matrix @ q
+        idx = select_top_k(scores, k, threshold)
+        found = idx
+    else:
+        rows = np.asarray(rows, dtype=np.int64)
+        scores = np.asarray(matrix[rows]) @ q if rows.size else np.empty(0, dtype=np.float32)
+        idx = select_top_k(scores, k, threshold)
+        found = rows[idx]
+    if with_total:
+        return found, scores[idx], count_matches(scores, threshold)
+    return found, scores[idx]
+
+
+def top_k_batch(matrix, queries, k=20, threshold=None):
+    """Score many queries in one (N, D) x (D, Q) product. Returns a list of (indices, scores)."""
+    q = np.asarray(queries, dtype=np.float32)
+    norms = np.linalg.norm(q, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    scores = matrix @ (q / norms).T  # (N, Q)
+    results = []
+    for j in range(scores.shape[1]):
+        col = np.ascontiguousarray(scores[:, j])
+        idx = select_top_k(col, k, threshold)
+        results.append((idx, col[idx]))
+    return results
@@ -0,0 +1,135 @@
+import numpy as np
+import re
+from collections import defaultdict
+
+# --- Smart Routing Index ---
+# Posting lists for the exact-filter routes of /api/search, built once per data
+# version so a hashtag, year or region query is a dictionary lookup instead of
+# a string scan over whole columns. Every posting list is a sorted int64 array
+# of df_codes row positions, so results keep table order.
+
+HASHTAG_COLS = ['protest_name', 'protest_name_v2', 'query']
+YEAR_RE = re.compile(r'\b(?:19|20)\d{2}\b')
+_HASHTAG_RE = re.compile(r'#\w+', re.UNICODE)
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+class HashtagTrie:
+    """Character trie over lower-cased hashtags (without '#') for prefix lookups."""
+
+    def __init__(self):
+        self.root = {}
+        self.postings = {}  # tag -> positions
+
+    def insert(self, tag, positions):
+        node = self.root
+        for ch in tag:
+            node = node.setdefault(ch, {})
+        node[None] = tag  # terminal marker
+        self.postings[tag] = positions
+
+    def tags_with_prefix(self, prefix):
+        node = self.root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        tags, stack = [], [node]
+        while stack:
+            node = stack.pop()
+            for ch, child in node.items():
+                if ch is None:
+                    tags.append(child)
+                else:
+                    stack.append(child)
+        return tags
+
+    def lookup(self, prefix):
+        """Row positions of every hashtag starting with `prefix`."""
+        hits = [self.postings[t] for t in self.tags_with_prefix(prefix)]
+        if not hits:
+            return _EMPTY
+        return hits[0] if len(hits) == 1 else np.unique(np.concatenate(hits))
+
+    def __len__(self):
+        return len(self.postings)
+
+
+def _postings(buckets):
+    return {key: np.array(sorted(rows), dtype=np.int64) for key, rows in buckets.items()}
+
+
+def _clean_year(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    text = str(value)
+    return text[:-2] if text.endswith('.0') else text
+
+
+def build_routing_index(df_codes):
+    """Posting lists for years, regions and hashtags, plus the set of theme topics."""
+    index = {"years": {}, "regions": {}, "topics": set(), "hashtags": HashtagTrie()}
+    if df_codes.empty:
+        return index
+
+    # 1. Years: the year column plus any 4-digit year mentioned in Timeline
+    years = defaultdict(set)
+    if 'year' in df_codes.columns:
+        for pos, value in enumerate(df_codes['year'].tolist()):
+            year = _clean_year(value)
+            if year:
+                years[year].add(pos)
+    if 'Timeline' in df_codes.columns:
+        for pos, value in enumerate(df_codes['Timeline'].tolist()):
+            if isinstance(value, str):
+                for year in YEAR_RE.findall(value):
+                    years[year].add(pos)
+    index["years"] = _postings(years)
+
+    # 2. Regions (area), normalized
+    if 'area' in df_codes.columns:
+        regions = defaultdict(set)
+        for pos, value in enumerate(df_codes['area'].tolist()):
+            if isinstance(value, str) and value.strip():
+                regions[value.strip().lower()].add(pos)
+        index["regions"] = _postings(regions)
+
+    # 3. Hashtags from the name and Twitter query columns
+    tags = defaultdict(set)
+    for col in HASHTAG_COLS:
+        if col not in df_codes.columns:
+            continue
+        for pos, value in enumerate(df_codes[col].tolist()):
+            if isinstance(value, str):
+                for tag in _HASHTAG_RE.findall(value):
+                    tags[tag[1:].lower()].add(pos)
+    for tag, positions in _postings(tags).items():
+        index["hashtags"].insert(tag, positions)
+
+    # 4. Topics (Themes)
+    theme_topics = {'Theme_political': 'political', 'Theme_economic': 'economic', 'Theme_social': 'social',
+                    'Theme_environmental': 'environmental', 'Theme_others': 'other'}
+    index["topics"] = {topic for col, topic in theme_topics.items() if col in df_codes.columns}
+    return index
+
+
+def lookup_hashtags(index, query):
+    """Rows matching every hashtag in `query`, each treated as a prefix ('#occupy' finds '#OccupyWallStreet')."""
+    tags = [t[1:].lower() for t in _HASHTAG_RE.findall(query)]
+    if not tags:
+        return _EMPTY
+    rows = None
+    for tag in tags:
+        hits = index["hashtags"].lookup(tag)
+        rows = hits if rows is None else np.intersect1d(rows, hits, assume_unique=True)
+        if rows.size == 0:
+            break
+    return rows
+
+
+def lookup_year(index, year):
+    return index["years"].get(year, _EMPTY)
+
+
+def lookup_region(index, region):
+    return index["regions"].get(region.strip().lower(), _EMPTY)
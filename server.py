@@ -1,17 +1,40 @@
 import pandas as pd
 import numpy as np
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
+from dataclasses import dataclass
+import threading
+import time
+import asyncio
 import os
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, OpenAI
 import uvicorn
-import pickle
 import json
-from sklearn.metrics.pairwise import cosine_similarity
+import re
+import base64
+import orjson
+from collections import Counter, deque
+from data_snapshot import CODES_FILE, RATIONAL_FILE, load_frames, normalize_id
+import vector_store
+import ann_index
+from ann_index import IVFIndex
+from facet_index import FacetIndex
+from routing_index import YEAR_RE, build_routing_index, lookup_hashtags, lookup_region, lookup_year
+from query_parser import is_semantic, parse_constraints
+import analytics
+import metrics
+import chat_router
+import context_selector
+from chat_context import ContextCache
+from lexical_index import BM25Index, SEARCH_COLS, build_documents
+from retrieval import top_k
+from query_cache import QueryEmbeddingCache, TwoTierCache, normalize_text, open_disk_cache
+from embedding_pipeline import build_rich_texts, clear_checkpoints, embed_texts, text_hash
 
 app = FastAPI()
 
@@ -22,250 +45,433 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],
 )
 
 # --- Global Data Storage ---
-DF_CODES = pd.DataFrame()
-DF_RATIONAL = pd.DataFrame()
-EMBEDDINGS = None # Numpy array of embeddings
-EMBEDDINGS_IDS = [] # List of IDs corresponding to embeddings row-wise
-
-# Smart Routing Metadata Index (For exact filtering)
-METADATA_INDEX = {
-    "years": set(),
-    "regions": set(),
-    "topics": set(),
-    "hashtags": set()
-}
+@dataclass(frozen=True)
+class DataStore:
+    """Immutable, versioned snapshot of everything the endpoints read.
+
+    A reload builds a complete new DataStore off to the side and swaps the
+    module-level reference in one assignment. Handlers grab the reference once
+    via get_store() and keep using it, so an in-flight request always finishes
+    on the version it started with. Never mutate a DataStore after creation.
+    """
+    version: int
+    dataset_hash: str
+    loaded_at: float
+    df_codes: pd.DataFrame
+    df_rational: pd.DataFrame
+    embeddings: Optional[np.ndarray]  # (N, D) matrix, read-only
+    embeddings_ids: List[str]         # IDs corresponding to embeddings row-wise
+    embedding_pos: np.ndarray         # df_codes row position of each embedding row (-1: none)
+    ann_index: Optional[IVFIndex]     # None -> exact brute-force scoring
+    lexical_index: Optional[BM25Index] # keyword fallback, doc i = df_codes row i
+    movements: List[Optional["Movement"]]  # precomputed API objects, movements[i] = df_codes row i
+    movement_pos: dict                # movement ID -> first df_codes row position
+    chat_names: dict                  # chat_router.build_name_index: names/hashtags -> protest_name
+    impact_order: np.ndarray          # row positions by #tweets descending (empty-query ranking)
+    movement_json: List[Optional[tuple]]  # pre-serialized (head, tail) bytes around the similarity value
+    summary_json: List[Optional[tuple]]   # same, projected to SUMMARY_FIELDS
+    facet_index: FacetIndex           # packed per-value bitmaps for /api/filter and pre-filtering
+    # Smart Routing Metadata Index (For exact filtering)
+    metadata_index: dict
+
+EMPTY_STORE = DataStore(
+    version=0,
+    dataset_hash="",
+    loaded_at=0.0,
+    df_codes=pd.DataFrame(),
+    df_rational=pd.DataFrame(),
+    embeddings=None,
+    embeddings_ids=[],
+    embedding_pos=np.empty(0, dtype=np.int64),
+    ann_index=None,
+    lexical_index=None,
+    movements=[],
+    movement_pos={},
+    chat_names=chat_router.build_name_index(pd.DataFrame()),
+    impact_order=np.empty(0, dtype=np.int64),
+    movement_json=[],
+    summary_json=[],
+    facet_index=FacetIndex.build(pd.DataFrame()),
+    metadata_index=build_routing_index(pd.DataFrame()),
+)
+STORE = EMPTY_STORE
+_RELOAD_LOCK = threading.Lock()
+_LOADED_SIGNATURE = None  # _source_signature() as of the live version (see _watch_source_files)
 
-CACHE_FILE = "embeddings_cache.pkl"
+def get_store() -> DataStore:
+    """Current data version. Read it ONCE per request and pass it along."""
+    return STORE
 
 # --- Global Configuration ---
 EMBEDDING_MODEL = "text-embedding-3-small"
 CHAT_MODEL = "gpt-4o"
 
-def get_openai_client():
+# Search pagination: default and maximum page size, shared by every route
+SEARCH_PAGE_SIZE = int(os.environ.get("SEARCH_PAGE_SIZE", "20"))
+SEARCH_MAX_LIMIT = int(os.environ.get("SEARCH_MAX_LIMIT", "100"))
+
+# Vector route: minimum cosine score
+VECTOR_MIN_SCORE = float(os.environ.get("VECTOR_MIN_SCORE", "0.15")) # Lowered global threshold to ensure recall
+
+# ANN index: below ANN_MIN_VECTORS brute force is exact and fast enough.
+# ANN_NPROBE trades recall for latency (more cells probed = higher recall);
+# ANN_NLIST=0 picks ~4*sqrt(N) cells.
+ANN_MIN_VECTORS = int(os.environ.get("ANN_MIN_VECTORS", "20000"))
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", "8"))
+ANN_NLIST = int(os.environ.get("ANN_NLIST", "0"))
+# Filtered vector search: a facet mask selecting less than this fraction of the
+# corpus is scored exactly (probed cells would hold too few allowed rows); above
+# it the index probes ANN_NPROBE / selectivity cells.
+ANN_FILTER_EXACT_BELOW = float(os.environ.get("ANN_FILTER_EXACT_BELOW", "0.1"))
+
+# Query embeddings: in-process LRU in front of a SQLite file shared by all workers
+# (QUERY_CACHE_DB). The file is opened in the startup hook, not on import, so
+# importing the module (tests, benchmarks) stays memory-only.
+QUERY_CACHE_DISK = None
+QUERY_EMBEDDINGS = QueryEmbeddingCache()
+TRANSLATIONS = TwoTierCache("translation")
+
+# Non-ASCII queries: "translate" (default), "skip" or "parallel" (see query_vectors)
+TRANSLATION_MODE = os.environ.get("TRANSLATION_MODE", "translate").lower()
+TRANSLATION_TIMEOUT = float(os.environ.get("TRANSLATION_TIMEOUT", "1.5"))
+_PENDING_TASKS = set()  # background translations that outlived their request
+
+# Chat router: "local" (rules in chat_router.py, no network), "hybrid" (local,
+# remote LLM only when the rules are undecided) or "remote" (always ask the LLM)
+ROUTER_MODE = os.environ.get("ROUTER_MODE", "local").lower()
+# Full-database chat context: "compact" (dictionary-coded) or "csv" (original
+# layout), shrunk to at most CHAT_CONTEXT_MAX_TOKENS estimated tokens (0 = no limit)
+CHAT_CONTEXT_FORMAT = os.environ.get("CHAT_CONTEXT_FORMAT", "compact").lower()
+CHAT_CONTEXT_MAX_TOKENS = int(os.environ.get("CHAT_CONTEXT_MAX_TOKENS", "12000"))
+FULL_CONTEXT = ContextCache()
+# "retrieval": only the movements relevant to the question (+ aggregates for
+# statistical questions, see context_selector.py); "full": the whole table
+CHAT_CONTEXT_MODE = os.environ.get("CHAT_CONTEXT_MODE", "retrieval").lower()
+CHAT_CONTEXT_TOP_K = int(os.environ.get("CHAT_CONTEXT_TOP_K", "25"))
+# /api/chat tool calling: model round trips with tools offered, rows per find_movements call
+CHAT_TOOL_ROUNDS = int(os.environ.get("CHAT_TOOL_ROUNDS", "3"))
+CHAT_TOOL_MAX_ROWS = int(os.environ.get("CHAT_TOOL_MAX_ROWS", "20"))
+# Hybrid search: parse year/region/theme/regime constraints out of /api/search queries
+HYBRID_SEARCH = os.environ.get("HYBRID_SEARCH", "1") == "1"
+# Dashboard aggregates (/api/stats/*), serialized once per data version and result set
+STATS_CACHE = analytics.StatsCache(int(os.environ.get("STATS_CACHE_SIZE", "256")))
+STATS_TOP_NAMES = int(os.environ.get("STATS_TOP_NAMES", "5"))
+# Time-to-first-token of recent /api/chat_stream requests (this worker)
+CHAT_TIMINGS = deque(maxlen=500)
+ROUTER_DECISIONS = Counter()
+# Prometheus metrics (/metrics, see metrics.py): per-stage latency histograms and route counters
+STAGE_SECONDS = metrics.REGISTRY.histogram(
+    "movement_lens_stage_seconds", "Duration of one request stage (search and chat).", ["stage"])
+SEARCH_SECONDS = metrics.REGISTRY.histogram(
+    "movement_lens_search_seconds", "Total /api/search latency by the route that answered.", ["route"])
+SEARCH_ROUTES = metrics.REGISTRY.counter(
+    "movement_lens_search_routes_total", "/api/search requests by the route that answered.", ["route"])
+CHAT_ROUTES = metrics.REGISTRY.counter(
+    "movement_lens_chat_router_decisions_total", "/api/chat_stream router decisions.", ["source", "decision"])
+
+@metrics.REGISTRY.collector
+def _cache_metrics():
+    samples = []
+    for name, cache in (("query_embedding", QUERY_EMBEDDINGS), ("translation", TRANSLATIONS)):
+        stats = cache.stats()
+        samples += [((name, result), stats[key]) for result, key in
+                    (("memory_hit", "memory_hits"), ("disk_hit", "disk_hits"), ("miss", "misses"))]
+    return metrics.counter_lines("movement_lens_cache_lookups_total", "Query cache lookups by cache and result.",
+                                 ("cache", "result"), samples)
+
+# --- OpenAI Clients ---
+# Created once and reused: every call goes over the same keep-alive connection
+# pool instead of a fresh client (and TLS handshake) per request. Request
+# handlers use the async client; the load path (embedding refresh, which runs
+# in a thread pool) uses the sync one.
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "2"))
+
+_CLIENT_LOCK = threading.Lock()
+_SYNC_CLIENT = None
+_ASYNC_CLIENT = None
+
+def _client_options():
+    """Keyword arguments shared by both clients, or None without an API key."""
     global EMBEDDING_MODEL, CHAT_MODEL
     api_key = os.environ.get("OPENAI_API_KEY")
     if not api_key:
         print("Warning: OPENAI_API_KEY not set. Vector search will fail.")
         return None
-    
+    options = {
+        "api_key": api_key,
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        "max_retries": OPENAI_MAX_RETRIES,
+    }
     # Check if it's an OpenRouter key to set the correct base_url
     if api_key.startswith("sk-or-"):
         # Use OpenRouter prefixes for models
         EMBEDDING_MODEL = "openai/text-embedding-3-small"
         # Switch to Google Gemini 3 Flash Preview as requested
-        CHAT_MODEL = "google/gemini-3-flash-preview" 
-        return OpenAI(
-            api_key=api_key,
-            base_url="https://openrouter.ai/api/v1"
-        )
-    return OpenAI(api_key=api_key)
+        CHAT_MODEL = "google/gemini-3-flash-preview"
+        options["base_url"] = "https://openrouter.ai/api/v1"
+    return options
 
-def normalize_id(val):
-    """Normalize ID to string, removing trailing .0 if present"""
-    s = str(val).strip()
-    if s.endswith('.0'):
-        return s[:-2]
-    return s
+def _pool_limits():
+    return httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_CONNECTIONS // 5 or 1)
 
-def load_data():
-    global DF_CODES, DF_RATIONAL, EMBEDDINGS, EMBEDDINGS_IDS
-    try:
-        print("Loading Excel data...")
-        # Load Coding Data - ONLY 'Coding_clean'
-        if os.path.exists('Coding_LATEST_LH.xlsx'):
-            try:
-                DF_CODES = pd.read_excel('Coding_LATEST_LH.xlsx', sheet_name='Coding_clean')
-                print("Loaded 'Coding_clean' sheet from Coding_LATEST_LH.xlsx")
-            except ValueError:
-                print("Sheet 'Coding_clean' not found, falling back to first sheet.")
-                DF_CODES = pd.read_excel('Coding_LATEST_LH.xlsx')
-
-            DF_CODES.columns = [c.strip() for c in DF_CODES.columns]
-            
-            # Normalize Index - PREFER ORIGINAL 'index' COLUMN
-            if 'index' in DF_CODES.columns:
-                DF_CODES['index'] = DF_CODES['index'].astype(str).apply(normalize_id)
-            elif 'no' in DF_CODES.columns:
-                # Fallback if 'index' is missing
-                DF_CODES['index'] = DF_CODES['no'].astype(str).apply(normalize_id)
-            else:
-                # Create default index if missing
-                DF_CODES['index'] = DF_CODES.index.astype(str)
-            
-            # --- Type Conversion for Analytics ---
-            # Ensure numeric columns are actually numeric for the Agent to calculate stats
-            numeric_cols = ['year', '#tweets', 'Length_Days']
-            for col in numeric_cols:
-                if col in DF_CODES.columns:
-                    DF_CODES[col] = pd.to_numeric(DF_CODES[col], errors='coerce')
-
-            # --- BUILD METADATA INDEX FOR SMART ROUTING ---
-            print("Building Smart Routing Index...")
-            # 1. Years
-            if 'year' in DF_CODES.columns:
-                unique_years = DF_CODES['year'].dropna().astype(str).unique()
-                # Clean up years (remove .0)
-                clean_years = set()
-                for y in unique_years:
-                    if y.endswith('.0'): clean_years.add(y[:-2])
-                    else: clean_years.add(y)
-                METADATA_INDEX["years"] = clean_years
-            
-            # 2. Regions (area)
-            if 'area' in DF_CODES.columns:
-                METADATA_INDEX["regions"] = set(DF_CODES['area'].dropna().str.lower().str.strip().unique())
-            
-            # 3. Topics (Themes)
-            # Check the theme columns
-            topics = set()
-            if 'Theme_political' in DF_CODES.columns: topics.add('political')
-            if 'Theme_economic' in DF_CODES.columns: topics.add('economic')
-            if 'Theme_social' in DF_CODES.columns: topics.add('social')
-            if 'Theme_environmental' in DF_CODES.columns: topics.add('environmental')
-            if 'Theme_others' in DF_CODES.columns: topics.add('other')
-            METADATA_INDEX["topics"] = topics
-            
-            print(f"Index Built: {len(METADATA_INDEX['years'])} Years, {len(METADATA_INDEX['regions'])} Regions")
-        
-        # Load Rationale Data - ONLY 'CodingRationale_clean'
-        if os.path.exists('CodingRational_LATEST.xlsx'):
-            try:
-                DF_RATIONAL = pd.read_excel('CodingRational_LATEST.xlsx', sheet_name='CodingRationale_clean')
-                print("Loaded 'CodingRationale_clean' sheet from CodingRational_LATEST.xlsx")
-            except ValueError:
-                print("Sheet 'CodingRationale_clean' not found, trying 'CodingRationale'...")
-                try:
-                    DF_RATIONAL = pd.read_excel('CodingRational_LATEST.xlsx', sheet_name='CodingRationale')
-                except ValueError:
-                    DF_RATIONAL = pd.read_excel('CodingRational_LATEST.xlsx')
-
-            DF_RATIONAL.columns = [c.strip() for c in DF_RATIONAL.columns]
-            
-            # Normalize Index for Rationale - PREFER ORIGINAL 'index' COLUMN
-            if 'index' in DF_RATIONAL.columns:
-                DF_RATIONAL['index'] = DF_RATIONAL['index'].astype(str).apply(normalize_id)
-            elif 'no' in DF_RATIONAL.columns:
-                DF_RATIONAL['index'] = DF_RATIONAL['no'].astype(str).apply(normalize_id)
-            else:
-                print("Warning: Rationale file has neither 'index' nor 'no' column!")
-            
-            # --- MERGE DESCRIPTION INTO DF_CODES ---
-            
-            # Normalize Index for Rationale
-            if 'index' in DF_RATIONAL.columns:
-                DF_RATIONAL['index'] = DF_RATIONAL['index'].apply(normalize_id)
-            elif 'no' in DF_RATIONAL.columns:
-                DF_RATIONAL['index'] = DF_RATIONAL['no'].apply(normalize_id)
-            
-            # --- MERGE DESCRIPTION INTO DF_CODES (THE NUCLEAR OPTION) ---
-            # Since rows are aligned by 'no', we can just merge based on 'index'
-            if not DF_CODES.empty and not DF_RATIONAL.empty:
-                print("Merging Rationale Description into Main Data...")
-                
-                # Ensure indices match for merging
-                # We'll create a dictionary mapping index -> description
-                desc_map = dict(zip(DF_RATIONAL['index'], DF_RATIONAL['Description']))
-                
-                # Map it to DF_CODES
-                DF_CODES['merged_description'] = DF_CODES['index'].map(desc_map)
-                
-                # Fill NaNs
-                DF_CODES['merged_description'] = DF_CODES['merged_description'].fillna("No rationale available.")
-                
-                # CRITICAL: Also update the main 'Description' column for backward compatibility 
-                # (e.g. for card summaries and embedding logic relying on row['Description'])
-                DF_CODES['Description'] = DF_CODES['merged_description']
-                
-                print("Merge complete. Added 'merged_description' and updated 'Description' column.")
-        
-        print("Data loaded. Checking embeddings cache...")
-        
-        # Load or Generate Embeddings
-        if os.path.exists(CACHE_FILE):
-            print("Found embeddings cache. Loading...")
-            with open(CACHE_FILE, 'rb') as f:
-                data = pickle.load(f)
-                EMBEDDINGS = data['vectors']
-                EMBEDDINGS_IDS = data['ids']
-            print(f"Loaded {len(EMBEDDINGS_IDS)} embeddings.")
-        else:
-            print("No cache found. Generating embeddings... (This may take a while)")
-            generate_embeddings()
-            
-    except Exception as e:
-        print(f"Error loading data: {e}")
-
-def generate_embeddings():
-    global EMBEDDINGS, EMBEDDINGS_IDS
-    client = get_openai_client()
-    if not client:
-        return
-
-    if DF_CODES.empty:
-        return
+def get_openai_client():
+    """Shared blocking client (data loading and other code off the event loop)."""
+    global _SYNC_CLIENT
+    with _CLIENT_LOCK:
+        if _SYNC_CLIENT is None:
+            options = _client_options()
+            if options is None:
+                return None
+            _SYNC_CLIENT = OpenAI(http_client=httpx.Client(limits=_pool_limits()), **options)
+        return _SYNC_CLIENT
+
+def get_async_client():
+    """Shared AsyncOpenAI client for request handlers."""
+    global _ASYNC_CLIENT
+    with _CLIENT_LOCK:
+        if _ASYNC_CLIENT is None:
+            options = _client_options()
+            if options is None:
+                return None
+            _ASYNC_CLIENT = AsyncOpenAI(http_client=httpx.AsyncClient(limits=_pool_limits()), **options)
+        return _ASYNC_CLIENT
+
+def impact_order(df_codes):
+    """Row positions by #tweets, highest first; ties and missing counts keep table order."""
+    if df_codes.empty or '#tweets' not in df_codes.columns:
+        return np.arange(len(df_codes), dtype=np.int64)
+    tweets = pd.to_numeric(df_codes['#tweets'], errors='coerce').fillna(-np.inf).to_numpy(dtype=float)
+    return np.argsort(-tweets, kind='stable')
+
+def build_store(version) -> DataStore:
+    """Build a complete DataStore from disk without touching the live one."""
+    print("Loading coding data...")
+    # Compiled snapshot when the Excel sources are unchanged, full Excel parse otherwise
+    df_codes, df_rational, dataset_hash = load_frames()
+
+    print("Building Smart Routing Index...")
+    metadata_index = build_routing_index(df_codes)
+    print(f"Index Built: {len(metadata_index['years'])} Years, {len(metadata_index['regions'])} Regions, {len(metadata_index['hashtags'])} Hashtags")
+
+    print("Building keyword index...")
+    lexical = BM25Index.build(build_documents(df_codes, df_rational))
+    print(f"Keyword index built: {len(lexical.postings)} terms")
+
+    print("Materializing movements...")
+    movements, movement_pos = build_movements(df_codes, df_rational)
+    movement_json = serialize_movements(movements)
+    summary_json = serialize_movements(movements, SUMMARY_FIELDS)
+
+    print("Data loaded. Checking embeddings cache...")
+    embeddings, embeddings_ids, generation = refresh_embeddings(df_codes, df_rational, dataset_hash)
+    ann = ann_index.load_or_build(embeddings, vector_store.STORE_DIR, generation, ANN_MIN_VECTORS, ANN_NLIST)
+
+    if embeddings is not None:
+        embeddings.flags.writeable = False
+    embedding_pos = np.array([movement_pos.get(i, -1) for i in embeddings_ids], dtype=np.int64)
+
+    print("Building facet bitmaps...")
+    facets = FacetIndex.build(df_codes)
+
+    return DataStore(
+        version=version,
+        dataset_hash=dataset_hash,
+        loaded_at=time.time(),
+        df_codes=df_codes,
+        df_rational=df_rational,
+        embeddings=embeddings,
+        embeddings_ids=list(embeddings_ids),
+        embedding_pos=embedding_pos,
+        ann_index=ann,
+        lexical_index=lexical,
+        movements=movements,
+        movement_pos=movement_pos,
+        chat_names=chat_router.build_name_index(df_codes, metadata_index),
+        impact_order=impact_order(df_codes),
+        movement_json=movement_json,
+        summary_json=summary_json,
+        facet_index=facets,
+        metadata_index=metadata_index,
+    )
 
-    vectors = []
-    ids = []
-    
-    # Iterate through DF_CODES
-    print(f"Processing {len(DF_CODES)} movements for embedding...")
-    
-    # Batch processing to be safe, though simple loop is fine for <10k rows
-    for _, row in DF_CODES.iterrows():
-        idx = str(row.get('index', ''))
-        name = str(row.get('protest_name', ''))
-        # Description is NOT in Coding_clean, so we initialize it as empty here
-        # and rely on the Rationale join below to populate it.
-        desc = "" 
-        theme = str(row.get('Theme_social', ''))
-        
-        # Try to find rationale
-        rationale_text = ""
-        if not DF_RATIONAL.empty:
-            match = DF_RATIONAL[DF_RATIONAL['index'] == idx]
-            if not match.empty:
-                # In the new sheet structure, Description is in the Rationale table
-                desc = str(match.iloc[0].get('Description', ''))
-                # If there are other columns in Rationale we want to add as context, do it here
-                # For now, we use Description as both the main description and context source
-                rationale_text = desc 
-        
-        # Additional context columns from Coding_clean
-        query_val = str(row.get('query', ''))
-        article = str(row.get('Article_Title', ''))
-        keywords = str(row.get('keywords_processed', ''))
-
-        # Construct Rich Text
-        # Format: "Movement: ... Description: ... Theme: ... Query: ... Article: ... Keywords: ..."
-        rich_text = f"Movement: {name}. Description: {desc}. Theme: {theme}. Query: {query_val}. Article: {article}. Keywords: {keywords}."
-        
+def load_data():
+    """(Re)build the DataStore and swap it in atomically. Returns True on success."""
+    global STORE, _LOADED_SIGNATURE
+    with _RELOAD_LOCK:
+        sources = _file_signature((CODES_FILE, RATIONAL_FILE))
         try:
-            # Call OpenAI API
-            res = client.embeddings.create(
-                input=rich_text,
-                model=EMBEDDING_MODEL
-            )
-            vec = res.data[0].embedding
-            vectors.append(vec)
-            ids.append(idx)
+            new_store = build_store(STORE.version + 1)
         except Exception as e:
-            print(f"Error embedding row {idx}: {e}")
-
-    # Convert to numpy array
-    if vectors:
-        EMBEDDINGS = np.array(vectors)
-        EMBEDDINGS_IDS = ids
-        
-        # Save to cache
-        with open(CACHE_FILE, 'wb') as f:
-            pickle.dump({'vectors': EMBEDDINGS, 'ids': EMBEDDINGS_IDS}, f)
-        print("Embeddings generated and saved.")
-
-# Initial Load
-load_data()
+            # Keep serving the previous version rather than a half-built one
+            print(f"Error loading data: {e}")
+            return False
+        STORE = new_store
+        # The source files as they were read, and the vector store as this load left it
+        # (refresh_embeddings rewrites meta.json, which must not look like a new change)
+        _LOADED_SIGNATURE = sources + _file_signature((_store_meta_path(),))
+        print(f"Data version {new_store.version} is live ({len(new_store.df_codes)} movements).")
+        # Render the chat context now rather than on the first chat request
+        full_database_context(new_store)
+        return True
+
+def _model_key(model):
+    """OpenRouter prefixes model names ('openai/text-embedding-3-small'); the vectors are the same."""
+    return model.split('/')[-1]
+
+def _vector_chunks(rows, stored, chunk_rows=8192):
+    """Blocks of the new store's matrix; rows are fresh vectors or row numbers into the old store.
+
+    Reused rows are copied from the old memmap one block at a time, so the full
+    matrix is never built in memory.
+    """
+    for start in range(0, len(rows), chunk_rows):
+        block = rows[start:start + chunk_rows]
+        reused = [i for i, r in enumerate(block) if isinstance(r, int)]
+        fresh = [i for i, r in enumerate(block) if not isinstance(r, int)]
+        dim = stored['vectors'].shape[1] if reused else len(block[fresh[0]])
+        chunk = np.empty((len(block), dim), dtype=np.float32)
+        if reused:
+            chunk[reused] = stored['vectors'][[block[i] for i in reused]]
+        for i in fresh:
+            chunk[i] = block[i]
+        yield chunk
+
+def refresh_embeddings(df_codes, df_rational, dataset_hash=""):
+    """Reuse stored vectors whose rich text and model are unchanged; embed only new or edited rows.
+
+    Vectors for rows that no longer exist are dropped. Returns (vectors, ids, generation),
+    where vectors is the read-only memory map of the vector store.
+    """
+    client = get_openai_client()  # also settles EMBEDDING_MODEL for this key
+    if df_codes.empty:
+        return None, [], ""
+
+    ids, texts = build_rich_texts(df_codes, df_rational)
+    hashes = [text_hash(t) for t in texts]
+
+    stored = vector_store.read_store()
+    cached = {}
+    if stored is not None:
+        print(f"Found vector store with {len(stored['ids'])} vectors.")
+        if not stored['model'] or _model_key(stored['model']) == _model_key(EMBEDDING_MODEL):
+            current = dict(zip(ids, hashes))
+            for row, (idx, h) in enumerate(zip(stored['ids'], stored['hashes'])):
+                # Rows migrated from the legacy pickle have no hash: trust them as-is
+                cached[idx] = (row, h if h is not None else current.get(idx))
+        else:
+            print(f"Store was built with '{stored['model']}', current model is '{EMBEDDING_MODEL}'. Re-embedding all rows.")
+
+    # Split rows into reusable and stale / new
+    pending = [pos for pos, (idx, h) in enumerate(zip(ids, hashes)) if cached.get(idx, (None, None))[1] != h]
+    dropped = len(set(cached) - set(ids))
+    print(f"Embeddings: {len(ids) - len(pending)} reused, {len(pending)} to embed, {dropped} dropped.")
+
+    fresh = {}
+    if pending and client:
+        results = embed_texts(client, EMBEDDING_MODEL, [texts[p] for p in pending])
+        for p, vec in zip(pending, results):
+            if vec is None:
+                print(f"Error embedding row {ids[p]}: no vector returned")
+            else:
+                fresh[p] = vec
+        if len(fresh) == len(pending):
+            clear_checkpoints()
+    elif pending:
+        print("Warning: OPENAI_API_KEY not set. New or edited rows keep stale (or no) vectors.")
+
+    rows, kept_ids, kept_hashes = [], [], []
+    for pos, (idx, h) in enumerate(zip(ids, hashes)):
+        if pos in fresh:
+            rows.append(fresh[pos]); kept_ids.append(idx); kept_hashes.append(h)
+        elif idx in cached:
+            # Either unchanged, or stale because it could not be refreshed. Keep the
+            # stored hash so a stale vector is retried on the next load.
+            row, old_hash = cached[idx]
+            rows.append(row); kept_ids.append(idx); kept_hashes.append(old_hash)
+
+    if not rows:
+        return None, [], ""
+
+    unchanged = (
+        stored is not None and not fresh and not dropped
+        and stored['model'] == EMBEDDING_MODEL
+        and stored['ids'] == kept_ids and stored['hashes'] == kept_hashes
+    )
+    if unchanged:
+        vector_store.update_dataset_hash(dataset_hash)
+        return stored['vectors'], stored['ids'], stored['generation']
+
+    vector_store.write_store_chunks(_vector_chunks(rows, stored), kept_ids, kept_hashes, EMBEDDING_MODEL, dataset_hash)
+    print(f"Saved {len(kept_ids)} embeddings to {vector_store.STORE_DIR}/.")
+    stored = vector_store.read_store()
+    return stored['vectors'], stored['ids'], stored['generation']
+
+# --- Hot Reload ---
+# Each uvicorn worker holds its own DataStore. POST /api/admin/reload refreshes the
+# worker that receives it; set DATA_WATCH_INTERVAL (seconds) to have every worker
+# poll the source files and reload itself when they change.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+DATA_WATCH_INTERVAL = float(os.environ.get("DATA_WATCH_INTERVAL", "0"))
+
+def _store_meta_path():
+    return os.path.join(vector_store.STORE_DIR, "meta.json")
+
+def _file_signature(paths):
+    sig = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            sig.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((path, None, None))
+    return tuple(sig)
+
+def _source_signature():
+    return _file_signature((CODES_FILE, RATIONAL_FILE, _store_meta_path()))
+
+def reload_in_background():
+    """Start a reload thread unless one is already running. Returns False if busy."""
+    if _RELOAD_LOCK.locked():
+        return False
+    threading.Thread(target=load_data, name="data-reload", daemon=True).start()
+    return True
+
+def _watch_source_files():
+    # Compared with what the live version was loaded from, so the server's own
+    # vector store writes (and reloads from /api/admin/reload) are not changes
+    attempted = None  # a failed load is retried on the next change, not every poll
+    while True:
+        time.sleep(DATA_WATCH_INTERVAL)
+        current = _source_signature()
+        if current != _LOADED_SIGNATURE and current != attempted:
+            print("Source data changed on disk. Reloading...")
+            attempted = current
+            load_data()
+
+@app.on_event("startup")
+def startup():
+    global QUERY_CACHE_DISK
+    # Open the pooled API clients before the first request needs them
+    get_async_client()
+    QUERY_CACHE_DISK = open_disk_cache()
+    QUERY_EMBEDDINGS.disk = TRANSLATIONS.disk = QUERY_CACHE_DISK
+    # Initial Load
+    load_data()
+    if DATA_WATCH_INTERVAL > 0:
+        threading.Thread(target=_watch_source_files, name="data-watcher", daemon=True).start()
+        print(f"Watching source data every {DATA_WATCH_INTERVAL:g}s for hot reload.")
+
+@app.on_event("shutdown")
+async def shutdown():
+    if _ASYNC_CLIENT is not None:
+        await _ASYNC_CLIENT.close()
 
 # --- Models ---
 class Movement(BaseModel):
@@ -316,6 +522,12 @@ class Movement(BaseModel):
     arrests: str
     reference: str
 
+# Card-grid fields for /api/search?view=summary; the rest is fetched lazily via /api/movements/{id}
+SUMMARY_FIELDS = (
+    'id', 'name', 'hashtag', 'year', 'region', 'iso', 'type', 'regime', 'description',
+    'outcome', 'impactScore', 'tags', 'similarity', 'tweets_count', 'star_rating',
+)
+
 class Rationale(BaseModel):
     movementId: str
     dimension: str
@@ -346,7 +558,10 @@ def format_float_to_int(val, default=""):
     except:
         return s
 
-def map_row_to_movement(row) -> Movement:
+_NUMBER_RE = re.compile(r"[-+]?\d*\.\d+|\d+")
+
+def map_row_to_movement(row, rat_row=None) -> Movement:
+    """Build the API Movement for one df_codes row and its first rationale row (or None)."""
     # Use normalized index if available, else fall back to raw
     idx = str(row.get('index', row.get('no', '0')))
     
@@ -406,8 +621,7 @@ def map_row_to_movement(row) -> Movement:
             elif 'thousand' in val_str or 'k' in val_str: mult = 1000
             
             # Extract number
-            import re
-            nums = re.findall(r"[-+]?\d*\.\d+|\d+", val_str)
+            nums = _NUMBER_RE.findall(val_str)
             if nums:
                 val = float(nums[0]) * mult
                 
@@ -430,13 +644,8 @@ def map_row_to_movement(row) -> Movement:
         star_rating = 1
 
     # --- RATIONALE LOOKUP ---
-    # Find matching row in DF_RATIONAL based on Index
+    # rat_row is the df_rational row with the same Index (see build_movements)
     rationales_found = {}
-    rat_row = None
-    if not DF_RATIONAL.empty:
-        matches = DF_RATIONAL[DF_RATIONAL['index'] == idx]
-        if not matches.empty:
-            rat_row = matches.iloc[0]
 
     # Helper to check if rationale is substantive (different from code)
     def get_rationale_if_diff(col_name_code, col_name_rat=None):
@@ -590,56 +799,295 @@ def map_row_to_movement(row) -> Movement:
         reference=f"{clean_nan(row.get('Authors'), 'Unknown Author')} ({format_float_to_int(row.get('Publication_Year'), 'n.d.')}). {clean_nan(row.get('Article_Title'), 'Title Unavailable')}."
     )
 
-def generate_full_context_csv():
-    """Generates a CSV-like string of the ENTIRE database."""
-    if DF_CODES.empty: return "Database is empty."
-    
-    context = "--- FULL DATABASE START ---\n"
-    context += "ID|Name|Year|Region|Category|Tweets|Duration|Reoccurrence|Impact|Offline|Participants|Outcome|Description\n"
-    
-    # Sort by year for chronological consistency
-    df_sorted = DF_CODES.sort_values(by='year', ascending=False)
-    
-    for _, row in df_sorted.iterrows():
-        # Extract fields
-        idx = str(row.get('index', ''))
-        name = str(row.get('protest_name', 'Unknown')).replace('|', '/') # Escape delimiter
-        year = str(row.get('year', 'Unknown'))
-        region = str(row.get('area', 'Global'))
-        
-        # Tags
-        tags = []
-        if str(row.get('Theme_political')).lower() != 'no': tags.append('Political')
-        if str(row.get('Theme_economic')).lower() != 'no': tags.append('Economic')
-        if str(row.get('Theme_environmental')).lower() != 'no': tags.append('Environmental')
-        if str(row.get('Theme_social')).lower() != 'no': tags.append('Social')
-        if str(row.get('Theme_others')).lower() != 'no': tags.append('Other')
-        category = ",".join(tags)
-        
-        tweets = str(row.get('#tweets', '0'))
-        duration = str(row.get('Length_Days', 'Unknown'))
-        reoccur = str(row.get('Reoccurrence', 'No'))
-        impact = str(row.get('Twitter_Penetration', 'N/A'))
-        offline = str(row.get('Offline', 'No'))
-        parts = str(row.get('Key_Participants', 'General')).replace('|', '/')
-        outcome = str(row.get('Outcome', 'Ongoing')).replace('|', '/')
-        
-        # Truncate description slightly to keep it sane
-        desc = str(row.get('Description', ''))[:500].replace('\n', ' ').replace('|', '/')
-        
-        line = f"{idx}|{name}|{year}|{region}|{category}|{tweets}|{duration}|{reoccur}|{impact}|{offline}|{parts}|{outcome}|{desc}\n"
-        context += line
-        
-    context += "--- FULL DATABASE END ---\n"
-    return context
+def build_movements(df_codes, df_rational):
+    """Materialize every Movement once per data version.
+
+    Returns (movements, movement_pos): movements[i] is the Movement for df_codes
+    row i (None if the row could not be mapped), movement_pos maps a movement ID
+    to its first row position.
+    """
+    rationale_rows = {}
+    if not df_rational.empty and 'index' in df_rational.columns:
+        for _, rat_row in df_rational.drop_duplicates(subset='index', keep='first').iterrows():
+            rationale_rows[rat_row['index']] = rat_row
+
+    movements = []
+    movement_pos = {}
+    for pos, (_, row) in enumerate(df_codes.iterrows()):
+        idx = str(row.get('index', row.get('no', '0')))
+        try:
+            movements.append(map_row_to_movement(row, rationale_rows.get(idx)))
+        except Exception as e:
+            print(f"Error mapping movement {idx}: {e}")
+            movements.append(None)
+        movement_pos.setdefault(idx, pos)
+    return movements, movement_pos
+
+# --- Pre-serialized Movement JSON ---
+# Each Movement is encoded once per data version. The bytes are split around the
+# similarity value so a response is just concatenation plus one small dumps().
+_SIMILARITY_SLOT = b'"similarity":null'
+
+def serialize_movements(movements, fields=None):
+    """orjson (head, tail) byte pairs per Movement, optionally projected to `fields`; None stays None."""
+    include = None if fields is None else set(fields) | {'similarity'}
+    encoded = []
+    for mov in movements:
+        if mov is None:
+            encoded.append(None)
+            continue
+        body = orjson.dumps(mov.model_dump(include=include))
+        # Inside strings a quote is always escaped, so this only matches the key
+        head, slot, tail = body.partition(_SIMILARITY_SLOT)
+        if not slot:
+            raise ValueError(f"Movement {mov.id} has a similarity set before serialization")
+        encoded.append((head + b'"similarity":', tail))
+    return encoded
+
+def resolve_projection(view: str, fields: Optional[str]):
+    """None (full payload), "summary", or a tuple of Movement field names from `fields=`."""
+    if fields:
+        requested = tuple(f.strip() for f in fields.split(',') if f.strip())
+        unknown = [f for f in requested if f not in Movement.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        # id is always needed to fetch the detail record
+        return ('id',) + tuple(f for f in requested if f != 'id')
+    if view == "summary":
+        return "summary"
+    if view != "full":
+        raise HTTPException(status_code=400, detail="view must be 'summary' or 'full'")
+    return None
+
+def movements_json(store: DataStore, positions, similarities=None, projection=None) -> bytes:
+    """JSON array of the Movements at `positions`, with optional per-row similarity.
+
+    `projection` comes from resolve_projection(); ad-hoc field lists are encoded
+    for this page only, the full and summary views are pre-serialized.
+    """
+    with STAGE_SECONDS.time(stage="serialization"):
+        if projection is None:
+            table = store.movement_json
+        elif projection == "summary":
+            table = store.summary_json
+        else:
+            positions = list(positions)
+            table = dict(zip(positions, serialize_movements([store.movements[p] for p in positions], projection)))
+        parts = []
+        for i, pos in enumerate(positions):
+            encoded = table[pos]
+            if encoded is None:
+                continue
+            head, tail = encoded
+            parts.append(head + (b"null" if similarities is None else orjson.dumps(similarities[i])) + tail)
+        return b"[" + b",".join(parts) + b"]"
+
+def json_response(body: bytes, headers=None) -> Response:
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# --- Pagination ---
+# Cursors are opaque base64 of "<data version>:<offset>". Every route yields a
+# stable ordering, so an offset into it is enough; a cursor from an older data
+# version is rejected because that ordering no longer exists.
+
+def encode_cursor(store: DataStore, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{store.version}:{offset}".encode()).decode().rstrip("=")
+
+def decode_cursor(store: DataStore, cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        version, offset = (int(part) for part in raw.split(":"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if version != store.version or offset < 0:
+        raise HTTPException(status_code=409, detail="Data was reloaded; restart from the first page")
+    return offset
+
+def page_slice(store: DataStore, positions, similarities, total, offset, limit):
+    """(page positions, page similarities, X-Total-Count / X-Next-Cursor headers) of an ordered result list.
+
+    `positions` (and `similarities`, a list or one value for all rows) are either
+    the whole ordering or at least its first offset + limit entries.
+    """
+    page = positions[offset:offset + limit]
+    if isinstance(similarities, float):
+        similarities = [similarities] * len(page)
+    elif similarities is not None:
+        similarities = similarities[offset:offset + limit]
+    headers = {"X-Total-Count": str(total)}
+    if offset + limit < total:
+        headers["X-Next-Cursor"] = encode_cursor(store, offset + limit)
+    return page, similarities, headers
+
+def page_response(store: DataStore, positions, similarities, total, offset, limit, projection=None) -> Response:
+    """One page of an ordered result list as a JSON array, with the paging headers."""
+    page, similarities, headers = page_slice(store, positions, similarities, total, offset, limit)
+    return json_response(movements_json(store, page, similarities, projection), headers)
+
+def full_database_context(store: DataStore):
+    """The movement table for the chat prompt, rendered once per data version (see chat_context.py)."""
+    return FULL_CONTEXT.get(store.df_codes, store.version, CHAT_CONTEXT_FORMAT, CHAT_CONTEXT_MAX_TOKENS)
+
+async def chat_database_context(store: DataStore, client, query):
+    """Database context for a chat question: relevant rows (or the full table in "full" mode)."""
+    if CHAT_CONTEXT_MODE == "full":
+        return full_database_context(store)
+    semantic = []
+    if store.embeddings is not None and client:
+        try:
+            q_vec = await embed_query(client, query)
+            rows, _, _ = await asyncio.to_thread(vector_top_k, store, q_vec, CHAT_CONTEXT_TOP_K, VECTOR_MIN_SCORE)
+            semantic = [store.movement_pos[store.embeddings_ids[i]] for i in rows if store.embeddings_ids[i] in store.movement_pos]
+        except Exception as e:
+            print(f"Chat context embedding failed: {e}. Using keyword matches.")
+    aggregates = FULL_CONTEXT.aggregates(store.df_codes, store.version)
+    return context_selector.select_context(store, query, semantic, CHAT_CONTEXT_TOP_K, CHAT_CONTEXT_FORMAT,
+                                           CHAT_CONTEXT_MAX_TOKENS, aggregates)
+
+async def embed_query(client, text):
+    """Query embedding through the two-tier cache; only a miss calls the API."""
+    vec = await QUERY_EMBEDDINGS.aget(text, EMBEDDING_MODEL)
+    if vec is None:
+        with STAGE_SECONDS.time(stage="query_embedding"):
+            res = await client.embeddings.create(input=text, model=EMBEDDING_MODEL)
+        vec = np.asarray(res.data[0].embedding, dtype=np.float32)
+        await QUERY_EMBEDDINGS.aput(text, EMBEDDING_MODEL, vec)
+    return vec
+
+async def translate_query(client, q):
+    """English keywords for a non-English query, cached across requests and workers."""
+    cached = await TRANSLATIONS.aget_bytes(normalize_text(q))
+    if cached is not None:
+        return cached.decode('utf-8')
+    print(f"Translating query: {q}")
+    # Use LLM to translate to English for better vector matching
+    with STAGE_SECONDS.time(stage="translation"):
+        trans_response = await client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": "Translate the following search query into English keywords for database search. Output ONLY the English translation, no other text."},
+                {"role": "user", "content": q}
+            ]
+        )
+    translated = trans_response.choices[0].message.content.strip()
+    print(f"Translated to: {translated}")
+    if translated:
+        await TRANSLATIONS.aput_bytes(normalize_text(q), translated.encode('utf-8'))
+    return translated or q
+
+def _finish_background_task(task):
+    _PENDING_TASKS.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Background translation failed: {task.exception()}")
+
+async def query_vectors(client, q, needs_translation):
+    """Query vectors to score, according to TRANSLATION_MODE.
+
+    translate: embed the English translation (original query if translation fails)
+    skip:      embed the original query directly (the embedding model is multilingual)
+    parallel:  embed the original while translating; also use the translation if it
+               is ready within TRANSLATION_TIMEOUT seconds
+    """
+    if not needs_translation or TRANSLATION_MODE == "skip":
+        return [await embed_query(client, q)]
+
+    if TRANSLATION_MODE == "parallel":
+        async def embed_translation():
+            return await embed_query(client, await translate_query(client, q))
+        translated = asyncio.create_task(embed_translation())
+        try:
+            vectors = [await embed_query(client, q)]
+        except Exception:
+            translated.cancel()
+            raise
+        try:
+            # shield: a late translation still finishes and lands in the cache for next time
+            vectors.append(await asyncio.wait_for(asyncio.shield(translated), TRANSLATION_TIMEOUT))
+        except asyncio.TimeoutError:
+            print(f"Translation not ready after {TRANSLATION_TIMEOUT}s. Using original query.")
+            _PENDING_TASKS.add(translated)
+            translated.add_done_callback(_finish_background_task)
+        except Exception as e:
+            print(f"Translation failed: {e}. Using original query.")
+        return vectors
+
+    try:
+        search_query = await translate_query(client, q)
+    except Exception as e:
+        print(f"Translation failed: {e}. Using original query.")
+        search_query = q
+    return [await embed_query(client, search_query)]
+
+def vector_top_k(store: DataStore, q_vec, k, threshold, mask=None):
+    """Top-k rows of store.embeddings plus the number above threshold: IVF index on large corpora, exact scan otherwise.
+
+    `mask` (boolean over df_codes rows, e.g. from the facet bitmaps) restricts
+    scoring to the movements it selects. Through the IVF index the total is a
+    lower bound (only probed cells are counted); a selective mask is scored exactly.
+    """
+    with STAGE_SECONDS.time(stage="similarity_scoring"):
+        rows = None
+        if mask is not None:
+            allowed = (store.embedding_pos >= 0) & mask[np.maximum(store.embedding_pos, 0)]
+            rows = np.flatnonzero(allowed)
+            selectivity = rows.size / max(len(allowed), 1)
+            if store.ann_index is not None and rows.size >= ANN_MIN_VECTORS and selectivity >= ANN_FILTER_EXACT_BELOW:
+                # Probe more cells as the mask thins them out, so about as many allowed rows are scored
+                nprobe = int(np.ceil(ANN_NPROBE / selectivity))
+                return store.ann_index.search(store.embeddings, q_vec, k=k, threshold=threshold, nprobe=nprobe,
+                                              with_total=True, allowed=allowed)
+        elif store.ann_index is not None:
+            return store.ann_index.search(store.embeddings, q_vec, k=k, threshold=threshold, nprobe=ANN_NPROBE, with_total=True)
+        # Stored rows are pre-normalized: one dot product + argpartition top-k (over the subset, if any)
+        return top_k(store.embeddings, q_vec, k=k, threshold=threshold, with_total=True, rows=rows)
+
+async def vector_search(store: DataStore, client, q, depth, mask=None):
+    """Semantic route: (positions, similarities in %, total) for the best-matching query vector."""
+    # Simple heuristic: if query contains non-ascii characters (likely CJK), translate it
+    needs_translation = any(ord(char) > 127 for char in q)
+    # English translation and/or original query, see TRANSLATION_MODE
+    candidates = []
+    for q_vec in await query_vectors(client, q, needs_translation):
+        # numpy releases the GIL: score off the event loop so other requests keep flowing
+        candidates.append(await asyncio.to_thread(vector_top_k, store, q_vec, depth, VECTOR_MIN_SCORE, mask))
+    # Keep whichever candidate query found the strongest match
+    top_indices, top_scores, total = max(candidates, key=lambda c: c[1][0] if len(c[1]) else -1.0)
+
+    with STAGE_SECONDS.time(stage="row_mapping"):
+        positions, similarities = [], []
+        for i, score in zip(top_indices, top_scores):
+            pos = store.movement_pos.get(store.embeddings_ids[i])
+            if pos is not None:
+                positions.append(pos)
+                similarities.append(round(float(score) * 100, 1)) # Convert to percentage
+    return positions, similarities, total
 
 # --- Tools Definition ---
+# Shared "filters" schema of the analytics tools (see analytics.filter_mask)
+ANALYTICS_FILTERS = {
+    "type": "object",
+    "description": "All optional; combined with AND. Text values are matched case-insensitively.",
+    "properties": {
+        "year": {"type": "integer"},
+        "year_from": {"type": "integer", "description": "First year, inclusive."},
+        "year_to": {"type": "integer", "description": "Last year, inclusive."},
+        "area": {"type": "string", "description": "Region code: GLOBAL, EU, AS, AF, SA or OA."},
+        "iso": {"type": "string", "description": "ISO 3166 alpha-3 country code, e.g. USA."},
+        "theme": {"type": "string", "enum": list(analytics.THEMES)},
+        "regime": {"type": "string", "description": "democracy, semi-democracy or authoritarian."},
+        "outcome": {"type": "string", "description": "e.g. policy revision, major policy change, regime change, fail, other reactions."},
+        "kind": {"type": "string", "description": "Kind of movement."},
+    },
+}
+
 tools = [
     {
         "type": "function",
         "function": {
             "name": "get_full_database_context",
-            "description": "Retrieve the FULL database content (all 151 movements). Use this ONLY when the user asks about global statistics (e.g. 'how many total movements?'), or for movements NOT visible in the current search results. If the user asks about the 'displayed' or 'searched' movements, DO NOT use this tool.",
+            "description": "Retrieve data from the FULL database (all movements, not only those on screen): the movements most relevant to the user's question plus database-wide statistics. Use this ONLY when the user asks about global statistics (e.g. 'how many total movements?'), or for movements NOT visible in the current search results. If the user asks about the 'displayed' or 'searched' movements, DO NOT use this tool.",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -648,247 +1096,463 @@ tools = [
                 "required": ["reason"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "aggregate_movements",
+            "description": "Exact count, sum or mean over the FULL database, optionally grouped and filtered. Use this for any counting or statistics question (e.g. 'how many movements in 2019' -> op=count, filters={year: 2019}; 'total tweets in Asia' -> op=sum, metric=tweets, filters={area: 'AS'}; 'movements per year' -> op=count, group_by=year). Returns a small JSON result.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "op": {"type": "string", "enum": list(analytics.OPERATIONS)},
+                    "metric": {"type": "string", "enum": list(analytics.METRICS), "description": "Value to sum or average (not needed for count)."},
+                    "group_by": {"type": "string", "enum": ["none", "theme", *analytics.DIMENSIONS]},
+                    "filters": ANALYTICS_FILTERS,
+                },
+                "required": ["op"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "find_movements",
+            "description": "List the movements in the FULL database matching filters and/or a name substring, most tweets first (name, year, region, country, regime, outcome, tweets, duration). Use this to check whether a movement exists or to list the movements behind a statistic.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "filters": ANALYTICS_FILTERS,
+                    "name_contains": {"type": "string", "description": "Case-insensitive substring of the movement name."},
+                    "limit": {"type": "integer", "description": f"Maximum movements to return (up to {CHAT_TOOL_MAX_ROWS})."},
+                },
+            }
+        }
     }
 ]
 
+async def run_tool(store: DataStore, client, query, name, arguments):
+    """Execute one chat tool call locally; returns the tool message content."""
+    try:
+        args = json.loads(arguments or "{}")
+    except json.JSONDecodeError:
+        args = None
+    # A malformed call becomes an error result for the model, never a failed chat request
+    if not isinstance(args, dict):
+        result = {"error": "Tool arguments must be a JSON object."}
+    elif not isinstance(args.get("filters") or {}, dict):
+        result = {"error": "'filters' must be a JSON object, e.g. {\"area\": \"EU\"}."}
+    else:
+        result = None
+    if result is not None:
+        print(f"Tool {name}: rejected arguments {str(arguments)[:200]}")
+        return orjson.dumps(result).decode('utf-8')
+    try:
+        if name == "get_full_database_context":
+            print("Agent decided to load FULL database context.")
+            return await chat_database_context(store, client, query)
+        if name == "aggregate_movements":
+            result = await asyncio.to_thread(
+                analytics.aggregate, store.df_codes, args.get("op", "count"), args.get("metric"),
+                args.get("group_by"), args.get("filters"),
+            )
+        elif name == "find_movements":
+            limit = min(max(int(args.get("limit") or 10), 1), CHAT_TOOL_MAX_ROWS)
+            result = await asyncio.to_thread(
+                analytics.lookup, store.df_codes, args.get("filters"), args.get("name_contains"), limit,
+            )
+        else:
+            result = {"error": f"Unknown tool: {name}"}
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        result = {"error": str(e)}
+    print(f"Tool {name}({args}) -> {str(result)[:200]}")
+    return orjson.dumps(result).decode('utf-8')
+
 # --- Routes ---
 
+def search_constraints(year_from, year_to, area, theme, regime):
+    """Facet constraints from the explicit /api/search parameters (see query_parser.py for the parsed ones)."""
+    constraints = {}
+    if year_from is not None:
+        constraints["year_from"] = year_from
+    if year_to is not None:
+        constraints["year_to"] = year_to
+    if area:
+        constraints["area"] = [a for a in area.split(",") if a.strip()]
+    if regime:
+        constraints["Regime_Democracy"] = [r for r in regime.split(",") if r.strip()]
+    if theme:
+        for t in theme.split(","):
+            col = analytics.THEMES.get(t.strip().lower())
+            if col is None:
+                raise HTTPException(status_code=400, detail=f"theme must be one of {', '.join(analytics.THEMES)}")
+            constraints[col] = ["yes"]
+    return constraints
+
 @app.get("/api/search", response_model=List[Movement])
-def search_movements(q: str = ""):
-    if DF_CODES.empty:
+async def search_movements(q: str = "", view: str = "full", fields: Optional[str] = None,
+                     limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_LIMIT), cursor: Optional[str] = None,
+                     year_from: Optional[int] = None, year_to: Optional[int] = None, area: Optional[str] = None,
+                     theme: Optional[str] = None, regime: Optional[str] = None):
+    """`view=summary` returns card fields only; `fields=a,b,c` picks exact Movement fields (id always included).
+
+    Every route is paged with `limit`/`cursor`; the total match count is in the
+    X-Total-Count header and the next page's cursor in X-Next-Cursor.
+
+    Hybrid search: year, region, theme and regime constraints are taken from the
+    parameters and/or parsed out of `q` ("... in Asia after 2018"); only the
+    movements that satisfy them are scored against the rest of the query.
+    """
+    start = time.perf_counter()
+    projection = resolve_projection(view, fields)
+    # Pin one data version for the whole request
+    store = get_store()
+    df_codes = store.df_codes
+    if df_codes.empty:
         return []
+    offset = decode_cursor(store, cursor)
+    depth = offset + limit  # ranked routes only need this many results
+
+    detected = []
+    def routed():
+        # Time spent deciding the route; ranked routes mark it before scoring
+        if not detected:
+            detected.append(True)
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage="route_detection")
+
+    def respond(positions, similarities=None, total=None, route="empty"):
+        routed()
+        response = page_response(store, positions, similarities, len(positions) if total is None else total,
+                                 offset, limit, projection)
+        SEARCH_ROUTES.inc(route=route)
+        SEARCH_SECONDS.observe(time.perf_counter() - start, route=route)
+        return response
+
+    requested = search_constraints(year_from, year_to, area, theme, regime)
     
-    # --- Case 0: Empty Query -> Return Top 20 by Tweet Count (Impact) ---
+    # --- Case 0: Empty Query -> Movements by Tweet Count (Impact) ---
     if not q or not q.strip():
-        try:
-            top_movements = DF_CODES.sort_values(by='#tweets', ascending=False).head(20)
-            return [map_row_to_movement(row) for _, row in top_movements.iterrows()]
-        except Exception as e:
-            print(f"Error sorting by tweets: {e}")
-            return [map_row_to_movement(row) for _, row in DF_CODES.head(20).iterrows()]
+        if requested:
+            mask = facet_mask(store, requested)
+            return respond(store.impact_order[mask[store.impact_order]], route="filter")
+        return respond(store.impact_order)
 
     query_lower = q.strip().lower()
     
     # --- SMART ROUTING LOGIC (Priority 1: Exact Filters) ---
     
-    # 1. Hashtag Search (Starts with #)
+    # Posting lists are built in load_data(); each route is a lookup, not a scan
+    def route_results(positions, route):
+        return respond(positions, 100.0, route=route)
+
+    # 1. Hashtag Search (Starts with #), prefix match on hashtags in name/query columns
     if q.strip().startswith("#"):
         print(f"Smart Route: Detected Hashtag '{q}'")
-        # Search explicitly in name/hashtag columns
-        mask = DF_CODES['protest_name'].astype(str).str.contains(q.strip(), case=False, na=False)
-        if 'protest_name_v2' in DF_CODES.columns:
-            mask |= DF_CODES['protest_name_v2'].astype(str).str.contains(q.strip(), case=False, na=False)
-        # Also check query column for hashtags
-        if 'query' in DF_CODES.columns:
-            mask |= DF_CODES['query'].astype(str).str.contains(q.strip(), case=False, na=False)
-            
-        results = DF_CODES[mask]
-        if not results.empty:
-            print(f"Smart Route: Found {len(results)} matches for hashtag.")
-            final_results = []
-            for _, row in results.iterrows():
-                try:
-                    mov = map_row_to_movement(row)
-                    mov.similarity = 100.0
-                    final_results.append(mov)
-                except: continue
-            return final_results
-
-    # 2. Year Filter
-    # Check if query matches a known year in our index
+        positions = lookup_hashtags(store.metadata_index, q)
+        if requested:
+            positions = positions[facet_mask(store, requested)[positions]]
+        if len(positions):
+            print(f"Smart Route: Found {len(positions)} matches for hashtag.")
+            return route_results(positions, "hashtag")
+
+    # --- HYBRID SEARCH: structured constraints + semantic remainder ---
+    text, constraints = parse_constraints(q.strip()) if HYBRID_SEARCH else (q.strip(), {})
+    constraints = known_constraints(store, constraints)
+    constraints.update(requested)  # explicit parameters win
+    semantic = is_semantic(text)
+    # A bare year or region keeps its smart route below (the year route also
+    # matches years mentioned in the Timeline)
+    bare_year = set(constraints) <= {"year_from", "year_to"} and constraints.get("year_from") == constraints.get("year_to")
+    bare_route = not requested and not semantic and (bare_year or query_lower in store.metadata_index["regions"])
+    if constraints and not bare_route:
+        mask = facet_mask(store, constraints)
+        print(f"Hybrid Route: {constraints} ({int(mask.sum())} candidates), text '{text}'")
+        if not semantic:
+            return route_results(store.impact_order[mask[store.impact_order]], "filter")
+        routed()
+        positions, similarities, total = await filtered_search(store, text, mask, depth)
+        return respond(positions, similarities, total, route="hybrid")
+
+    # 2. Year Filter (year column and years mentioned in Timeline)
     # Use Regex to extract 4-digit year from query (e.g. "2014年", "Year 2014")
-    import re
-    year_match = re.search(r'\b(19|20)\d{2}\b', q)
+    year_match = YEAR_RE.search(q)
     target_year = None
-    
+
     if year_match:
         target_year = year_match.group(0)
-    elif query_lower in METADATA_INDEX["years"]:
-        target_year = q.strip()
-        
+    elif query_lower in store.metadata_index["years"]:
+        target_year = query_lower
+
     if target_year:
         print(f"Smart Route: Detected Year '{target_year}' from query '{q}'")
-        mask = DF_CODES['year'].astype(str).str.contains(target_year, na=False)
-        if 'Timeline' in DF_CODES.columns:
-             mask |= DF_CODES['Timeline'].astype(str).str.contains(target_year, na=False)
-        
-        results = DF_CODES[mask]
-        if not results.empty:
-             final_results = []
-             for _, row in results.iterrows():
-                try:
-                    mov = map_row_to_movement(row)
-                    mov.similarity = 100.0
-                    final_results.append(mov)
-                except: continue
-             return final_results
+        positions = lookup_year(store.metadata_index, target_year)
+        if len(positions):
+            return route_results(positions, "year")
 
     # 3. Region Filter (Exact Match)
-    if query_lower in METADATA_INDEX["regions"]:
+    positions = lookup_region(store.metadata_index, query_lower)
+    if len(positions):
         print(f"Smart Route: Detected Region '{query_lower}'")
-        mask = DF_CODES['area'].astype(str).str.lower().str.strip() == query_lower
-        results = DF_CODES[mask]
-        if not results.empty:
-             final_results = []
-             for _, row in results.iterrows():
-                try:
-                    mov = map_row_to_movement(row)
-                    mov.similarity = 100.0
-                    final_results.append(mov)
-                except: continue
-             return final_results
+        return route_results(positions, "region")
 
     # --- SEMANTIC SEARCH (Priority 2: AI Embeddings) ---
-    client = get_openai_client()
+    client = get_async_client()
+    routed()
     
     # Strategy: 
     # 1. If we have embeddings and API key -> Vector Search
     # 2. Else -> Fallback to keyword search
             
-    if EMBEDDINGS is not None and client:
+    if store.embeddings is not None and client:
         try:
-            # 1. Detect language and translate if necessary
-            # Simple heuristic: if query contains non-ascii characters (likely CJK), translate it
-            needs_translation = any(ord(char) > 127 for char in q)
-            
-            search_query = q
-            if needs_translation:
-                print(f"Translating query: {q}")
-                try:
-                    # Use LLM to translate to English for better vector matching
-                    trans_response = client.chat.completions.create(
-                        model=CHAT_MODEL,
-                        messages=[
-                            {"role": "system", "content": "Translate the following search query into English keywords for database search. Output ONLY the English translation, no other text."},
-                            {"role": "user", "content": q}
-                        ]
-                    )
-                    search_query = trans_response.choices[0].message.content.strip()
-                    print(f"Translated to: {search_query}")
-                except Exception as e:
-                    print(f"Translation failed: {e}. Using original query.")
-
-            # 2. Vector Search with English query
-            res = client.embeddings.create(input=search_query, model=EMBEDDING_MODEL)
-            q_vec = np.array(res.data[0].embedding).reshape(1, -1)
-            
-            # Compute cosine similarity
-            # EMBEDDINGS is (N, D), q_vec is (1, D)
-            scores = cosine_similarity(EMBEDDINGS, q_vec).flatten()
-            
-            # Get top 20 indices
-            top_indices = scores.argsort()[-20:][::-1]
-            
-            results = []
+            # Vector Search (translating non-English queries, see TRANSLATION_MODE)
+            positions, similarities, total = await vector_search(store, client, q, depth)
             print(f"--- Search Results for '{q}' ---")
-            for i in top_indices:
-                score = scores[i]
-                target_id = EMBEDDINGS_IDS[i]
-                
-                # Debug print
-                # Find row name for debug
-                debug_row = DF_CODES[DF_CODES['index'] == target_id]
-                if not debug_row.empty:
-                    d_name = debug_row.iloc[0].get('protest_name', 'Unknown')
-                    # print(f"Candidate: {d_name}, Score: {score:.4f}")
-
-                if score < 0.15: # Lowered global threshold to ensure recall
-                    continue
-
-                target_id = EMBEDDINGS_IDS[i]
-                # Find row in DF
-                row = DF_CODES[DF_CODES['index'] == target_id]
-                if not row.empty:
-                    mov = map_row_to_movement(row.iloc[0])
-                    mov.similarity = round(float(score) * 100, 1) # Convert to percentage
-                    results.append(mov)
-                    
-            return results
+            return respond(positions, similarities, total, route="vector")
             
         except Exception as e:
             print(f"Vector search failed: {e}. Falling back to keyword.")
             pass # Fallback
             
-    # Fallback Keyword Search
+    # Fallback Keyword Search (CPU-bound on large corpora, so off the event loop)
+    positions, similarities, total = await asyncio.to_thread(keyword_search, store, q, depth)
+    return respond(positions, similarities, total, route="keyword")
+
+def keyword_search(store: DataStore, q, depth):
+    """Keyword fallback of /api/search: ranked BM25, then a substring scan.
+
+    Returns (positions, similarities, total) like the other routes feed to page_response.
+    """
+    df_codes = store.df_codes
+    # Ranked BM25 over the prebuilt inverted index
     try:
+        if store.lexical_index is not None:
+            positions, scores, total = store.lexical_index.search(q, k=depth, with_total=True)
+            if total:
+                # Relative relevance so the badge still appears, best match = 100
+                return positions, [round(float(score / scores[0]) * 100, 1) for score in scores], total
+
+        # No whole-token match (e.g. a partial word): substring scan as last resort
         query = q.lower()
-        # Expanded search columns to ensure hashtags and queries are caught
-        search_cols = ['protest_name', 'Description', 'Theme_social', 'protest_name_v2', 'query', 'Keywords_FACTIVA_for_daybyday_search', 'Article_Title']
-        valid_cols = [c for c in search_cols if c in DF_CODES.columns]
+        valid_cols = [c for c in SEARCH_COLS if c in df_codes.columns]
         
-        mask = pd.Series(False, index=DF_CODES.index)
+        mask = pd.Series(False, index=df_codes.index)
         for col in valid_cols:
-            mask |= DF_CODES[col].astype(str).str.lower().str.contains(query, na=False)
+            mask |= df_codes[col].astype(str).str.lower().str.contains(query, na=False, regex=False)
         
-        results = DF_CODES[mask].head(20)
+        positions = np.flatnonzero(mask.to_numpy())
         
-        # Manually assign similarity for keyword matches so the badge appears
-        final_results = []
-        for _, row in results.iterrows():
-            try:
-                mov = map_row_to_movement(row)
-                mov.similarity = 100.0 # Indicate exact/keyword match
-                final_results.append(mov)
-            except Exception as e:
-                print(f"Error mapping row during keyword search: {e}")
-                continue
-            
-        return final_results
+        # Manually assign similarity for keyword matches so the badge appears (exact/keyword match)
+        return positions, 100.0, len(positions)
     except Exception as e:
         print(f"Keyword search error: {e}")
-        return []
+        return [], None, 0
+
+# --- Faceted Filtering ---
+# Any facet column of FacetIndex is a query parameter (?area=EU&Offline=yes);
+# these names are reserved for the request itself.
+FILTER_PARAMS = {"q", "view", "fields", "limit", "cursor", "year_from", "year_to"}
+
+def facet_selection(store: DataStore, constraints):
+    """{facet: bitmap} for {facet: [values], "year_from": year, "year_to": year}; 400 on unknown facets or values."""
+    selection = {}
+    try:
+        for facet, values in constraints.items():
+            if facet not in ("year_from", "year_to") and values:
+                selection[facet] = store.facet_index.select(facet, values)
+        year_from, year_to = constraints.get("year_from"), constraints.get("year_to")
+        if year_from or year_to:
+            years = store.facet_index.select_years(int(year_from) if year_from else None,
+                                                   int(year_to) if year_to else None)
+            selection["year"] = selection["year"] & years if "year" in selection else years
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return selection
+
+def known_constraints(store: DataStore, constraints):
+    """Parsed constraints without facets or values the data does not have.
+
+    Only explicit parameters get the 400 of facet_selection; a region or theme
+    read from free text that matches nothing is dropped instead.
+    """
+    kept = {}
+    for facet, values in constraints.items():
+        if facet in ("year_from", "year_to"):
+            kept[facet] = values
+        else:
+            values = store.facet_index.known(facet, values)
+            if values:
+                kept[facet] = values
+    return kept
+
+def facet_mask(store: DataStore, constraints):
+    mask, _ = store.facet_index.evaluate(facet_selection(store, constraints))
+    return mask
+
+async def filtered_search(store: DataStore, q, mask, depth):
+    """Ranked matches for `q` among the rows in mask: pre-filtered vector route, keyword fallback."""
+    client = get_async_client()
+    if store.embeddings is not None and client:
+        try:
+            return await vector_search(store, client, q, depth, mask)
+        except Exception as e:
+            print(f"Vector search failed: {e}. Falling back to keyword.")
+    positions, similarities, _ = await asyncio.to_thread(keyword_search, store, q, len(store.df_codes))
+    if isinstance(similarities, float):
+        similarities = [similarities] * len(positions)
+    keep = [i for i, pos in enumerate(positions) if mask[pos]]
+    return [positions[i] for i in keep], [similarities[i] for i in keep], len(keep)
+
+@app.get("/api/filter")
+async def filter_movements(request: Request, q: str = "", view: str = "full", fields: Optional[str] = None,
+                           limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_LIMIT), cursor: Optional[str] = None):
+    """Movements matching every facet, e.g. ?Regime_Democracy=democracy&State_response_repression=yes&Theme_environmental=yes&year_from=2015&year_to=2020.
+
+    Values of one facet are OR-ed (area=EU,AS), facets are AND-ed. Returns
+    {"total", "counts", "movements"}: counts[facet][value] is how many movements
+    would match with that value in place of the facet's current selection.
+    Ordered by impact, or by relevance to `q` (scored only within the filter).
+    Paged and projected like /api/search.
+    """
+    projection = resolve_projection(view, fields)
+    store = get_store()
+    offset = decode_cursor(store, cursor)
+    params = request.query_params
+    constraints = {k: [v for raw in params.getlist(k) for v in raw.split(",") if v.strip()]
+                   for k in params.keys() if k not in FILTER_PARAMS}
+    constraints.update({k: params[k] for k in ("year_from", "year_to") if params.get(k)})
+    mask, counts = store.facet_index.evaluate(facet_selection(store, constraints))
+
+    similarities = None
+    if q.strip():
+        positions, similarities, total = await filtered_search(store, q.strip(), mask, offset + limit)
+    else:
+        positions = store.impact_order[mask[store.impact_order]]
+        total = len(positions)
+    page, similarities, headers = page_slice(store, positions, similarities, total, offset, limit)
+    body = (b'{"total":' + str(total).encode() + b',"counts":' + orjson.dumps(counts)
+            + b',"movements":' + movements_json(store, page, similarities, projection) + b'}')
+    return json_response(body, headers)
 
 @app.get("/api/debug_rationales")
 def debug_rationales():
     """Temporary endpoint to debug Rationale data loading on Render"""
-    if DF_RATIONAL.empty:
-        return {"status": "error", "message": "DF_RATIONAL is empty!", "files_found": os.listdir('.')}
+    df_rational = get_store().df_rational
+    if df_rational.empty:
+        return {"status": "error", "message": "df_rational is empty!", "files_found": os.listdir('.')}
     
     return {
         "status": "ok",
-        "count": len(DF_RATIONAL),
-        "columns": DF_RATIONAL.columns.tolist(),
-        "sample_ids": DF_RATIONAL['index'].head(10).tolist(),
-        "sample_row": DF_RATIONAL.iloc[0].to_dict() if not DF_RATIONAL.empty else {},
+        "count": len(df_rational),
+        "columns": df_rational.columns.tolist(),
+        "sample_ids": df_rational['index'].head(10).tolist(),
+        "sample_row": df_rational.iloc[0].to_dict() if not df_rational.empty else {},
         "current_dir_files": os.listdir('.')
     }
 
+@app.get("/metrics")
+def prometheus_metrics():
+    """Stage latency histograms, route counters and cache hit counters in the Prometheus text format.
+
+    Values are this process's only: scrape one single-worker server per target (see metrics.py).
+    """
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/debug_chat")
+def debug_chat():
+    """Time-to-first-token and router statistics for /api/chat_stream (this worker)."""
+    timings = list(CHAT_TIMINGS)
+    def pct(key, p):
+        values = sorted(t[key] for t in timings)
+        return round(values[min(len(values) - 1, int(p * len(values)))], 1) if values else None
+    return {
+        "router_mode": ROUTER_MODE,
+        "requests": len(timings),
+        "ttft_ms": {"p50": pct("ttft_ms", 0.5), "p95": pct("ttft_ms", 0.95)},
+        "router_ms": {"p50": pct("router_ms", 0.5), "p95": pct("router_ms", 0.95)},
+        "decisions": dict(ROUTER_DECISIONS),
+    }
+
+@app.get("/api/debug_cache")
+def debug_cache():
+    """Hit/miss counters for the query-embedding and translation caches (this worker)."""
+    stats = QUERY_EMBEDDINGS.stats()
+    stats["translation"] = TRANSLATIONS.stats()
+    if QUERY_CACHE_DISK is not None:
+        stats["disk_bytes"] = QUERY_CACHE_DISK.size_bytes()
+        stats["disk_evictions"] = QUERY_CACHE_DISK.evictions
+    return stats
+
 # --- DEBUG ENDPOINT (CRITICAL) ---
 @app.get("/api/debug_data_match")
 def debug_data_match():
     """Diagnose why Codes and Rationales are not matching"""
+    store = get_store()
+    df_codes, df_rational = store.df_codes, store.df_rational
     report = {
         "status": "ok",
-        "codes_count": len(DF_CODES),
-        "rational_count": len(DF_RATIONAL),
+        "codes_count": len(df_codes),
+        "rational_count": len(df_rational),
         "codes_sample": [],
         "rational_sample": [],
         "match_test": "Not performed"
     }
     
-    if not DF_CODES.empty:
+    if not df_codes.empty:
         # Show ID and Name from main table
         cols = ['index', 'no', 'protest_name']
-        valid_cols = [c for c in cols if c in DF_CODES.columns]
-        report["codes_sample"] = DF_CODES[valid_cols].head(5).to_dict(orient='records')
+        valid_cols = [c for c in cols if c in df_codes.columns]
+        report["codes_sample"] = df_codes[valid_cols].head(5).to_dict(orient='records')
         
-    if not DF_RATIONAL.empty:
+    if not df_rational.empty:
         # Show ID and Name from rationale table
         cols = ['index', 'no', 'protest_name_v2'] # Assuming protest_name_v2 is the name col in rational
-        valid_cols = [c for c in cols if c in DF_RATIONAL.columns]
-        report["rational_sample"] = DF_RATIONAL[valid_cols].head(5).to_dict(orient='records')
+        valid_cols = [c for c in cols if c in df_rational.columns]
+        report["rational_sample"] = df_rational[valid_cols].head(5).to_dict(orient='records')
 
     # Try to find a match for the first row of Codes
-    if not DF_CODES.empty and not DF_RATIONAL.empty:
-        target_id = str(DF_CODES.iloc[0].get('index', ''))
-        match = DF_RATIONAL[DF_RATIONAL['index'] == target_id]
+    if not df_codes.empty and not df_rational.empty:
+        target_id = str(df_codes.iloc[0].get('index', ''))
+        match = df_rational[df_rational['index'] == target_id]
         report["match_test"] = f"Searching for Code ID '{target_id}' in Rationale table... Found {len(match)} matches."
 
     return report
 
+# --- ADMIN: HOT RELOAD ---
+@app.post("/api/admin/reload", status_code=202)
+def admin_reload(x_admin_token: str = Header(default="")):
+    """Rebuild the DataStore in the background and swap it in when complete.
+
+    Requests already running keep the version they started with.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Reload disabled: ADMIN_TOKEN not set")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+    store = get_store()
+    started = reload_in_background()
+    return {
+        "status": "reloading" if started else "busy",
+        "current_version": store.version,
+        "dataset_hash": store.dataset_hash,
+    }
+
+@app.get("/api/movements/{id}", response_model=Movement)
+def get_movement(id: str):
+    """Full detail record (rationales, references, ...) for one movement."""
+    store = get_store()
+    pos = store.movement_pos.get(normalize_id(id))
+    if pos is None or store.movement_json[pos] is None:
+        raise HTTPException(status_code=404, detail=f"Movement {id} not found")
+    head, tail = store.movement_json[pos]
+    return json_response(head + b"null" + tail)
+
 @app.get("/api/rationales", response_model=List[Rationale])
 def get_rationales(id: str):
-    if DF_RATIONAL.empty:
+    store = get_store()
+    df_codes, df_rational = store.df_codes, store.df_rational
+    if df_rational.empty:
         return []
     
     # Normalize query ID
@@ -898,14 +1562,14 @@ def get_rationales(id: str):
     print(f"--- FETCHING RATIONALES FOR ID: {clean_id} (Original: {id}) ---")
     
     # 1. Try Strict ID Match
-    matches = DF_RATIONAL[DF_RATIONAL['index'] == clean_id]
+    matches = df_rational[df_rational['index'] == clean_id]
     
     if not matches.empty:
         print(f"  -> Found match by ID! Name: {matches.iloc[0].get('protest_name_v2')}")
     else:
         print(f"  -> NO match by ID '{clean_id}'.")
         # Diagnostic: Check if this ID exists in Codes
-        code_match = DF_CODES[DF_CODES['index'] == clean_id]
+        code_match = df_codes[df_codes['index'] == clean_id]
         if not code_match.empty:
             target_name = str(code_match.iloc[0].get('protest_name', '')).strip()
             print(f"  -> This ID corresponds to Code Name: '{target_name}'")
@@ -913,15 +1577,15 @@ def get_rationales(id: str):
             # 2. Try Name Match (Fallback)
             if target_name:
                 print(f"  -> Attempting Name Fallback with: '{target_name}'")
-                matches = DF_RATIONAL[DF_RATIONAL['protest_name_v2'].astype(str).str.strip() == target_name]
+                matches = df_rational[df_rational['protest_name_v2'].astype(str).str.strip() == target_name]
                 
                 if matches.empty:
                     # Loose Match
-                    matches = DF_RATIONAL[DF_RATIONAL['protest_name_v2'].astype(str).str.contains(target_name, regex=False, case=False)]
+                    matches = df_rational[df_rational['protest_name_v2'].astype(str).str.contains(target_name, regex=False, case=False)]
                     if not matches.empty:
                         print(f"  -> Found Loose Name match: {matches.iloc[0].get('protest_name_v2')}")
         else:
-            print("  -> This ID does not even exist in DF_CODES!")
+            print("  -> This ID does not even exist in df_codes!")
 
     # Debug if still empty
     if matches.empty:
@@ -939,9 +1603,46 @@ def get_rationales(id: str):
         ))
     return res
 
+# --- Dashboard Statistics ---
+# Aggregates for the dashboard charts, over the whole database or over a search
+# result set passed as ?ids=1,2,3 (unknown ids are ignored).
+
+def stats_response(store: DataStore, dimension, ids=None):
+    positions = None
+    if ids:
+        wanted = {store.movement_pos.get(normalize_id(i)) for i in ids.split(",") if i.strip()}
+        positions = tuple(sorted(p for p in wanted if p is not None))
+
+    def build():
+        mask = None if positions is None else analytics.filter_mask(store.df_codes, positions=positions)
+        return orjson.dumps(analytics.breakdown(store.df_codes, dimension, mask, STATS_TOP_NAMES))
+
+    return json_response(STATS_CACHE.get((store.version, dimension, positions), build))
+
+@app.get("/api/stats/timeline")
+def stats_timeline(ids: Optional[str] = None):
+    """Movements and tweets per year."""
+    return stats_response(get_store(), "year", ids)
+
+@app.get("/api/stats/themes")
+def stats_themes(ids: Optional[str] = None):
+    """Movements per theme (a movement can have several)."""
+    return stats_response(get_store(), "theme", ids)
+
+@app.get("/api/stats/regime")
+def stats_regime(ids: Optional[str] = None):
+    """Movements per political regime."""
+    return stats_response(get_store(), "regime", ids)
+
+@app.get("/api/stats/by_iso")
+def stats_by_iso(ids: Optional[str] = None):
+    """Movements per country (ISO alpha-3) for the map; multi-country movements count for each."""
+    return stats_response(get_store(), "iso", ids)
+
 @app.post("/api/chat")
-def chat_with_ai(req: ChatRequest):
-    client = get_openai_client()
+async def chat_with_ai(req: ChatRequest):
+    store = get_store()
+    client = get_async_client()
     if not client:
         raise HTTPException(status_code=500, detail="OpenAI API Key not set")
     
@@ -959,11 +1660,12 @@ def chat_with_ai(req: ChatRequest):
     
     You have access to two sources of information:
     1. **Current Search Results**: The movements currently displayed on the user's screen (provided in context).
-    2. **Full Database**: The entire dataset of 151 movements (accessible via the `get_full_database_context` tool).
+    2. **Full Database**: The entire dataset of 151 movements (accessible via the `aggregate_movements`, `find_movements` and `get_full_database_context` tools).
     
     **YOUR STRATEGY:**
     - **First Priority**: Answer the user's question using ONLY the `Current Search Results` if possible. This is faster and more relevant for questions like "Which of these..." or "How many movements did I find?".
-    - **Second Priority**: If the user asks about Global Statistics (e.g. "Total movements in database", "Global tweet count"), or asks for a movement NOT in the current list, YOU MUST CALL the `get_full_database_context` tool.
+    - **Second Priority**: If the user asks about Global Statistics (e.g. "Total movements in database", "Global tweet count", "movements per year"), CALL the `aggregate_movements` tool and report its exact numbers. Never count rows yourself.
+    - **Third Priority**: If the user asks for a movement NOT in the current list, CALL `find_movements` (or `get_full_database_context` for open-ended questions that need descriptions).
     
     **CRITICAL RULES:**
     - **Context Awareness**: The `Current Search Results` list IS the user's screen. If a movement is NOT in that list, you MUST say "It is not currently displayed in your search results".
@@ -979,7 +1681,7 @@ def chat_with_ai(req: ChatRequest):
     
     try:
         # First Call: Let AI decide if it needs the full database
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=CHAT_MODEL,
             messages=messages,
             tools=tools,
@@ -988,45 +1690,66 @@ def chat_with_ai(req: ChatRequest):
         
         response_message = response.choices[0].message
         
-        # Check for tool calls
-        if response_message.tool_calls:
+        # Tool calls are executed locally and fed back; the model may chain a few
+        # (e.g. aggregate, then list the movements behind the number)
+        rounds = 0
+        while response_message.tool_calls:
             # Append the assistant's thought process
             messages.append(response_message)
             
-            for tool_call in response_message.tool_calls:
-                func_name = tool_call.function.name
-                
-                if func_name == "get_full_database_context":
-                    print("Agent decided to load FULL database context.")
-                    full_data = generate_full_context_csv()
-                    
-                    # Feed the full data back as tool output
-                    messages.append({
-                        "tool_call_id": tool_call.id,
-                        "role": "tool",
-                        "name": func_name,
-                        "content": full_data
-                    })
+            results = await asyncio.gather(*(
+                run_tool(store, client, req.query, tool_call.function.name, tool_call.function.arguments)
+                for tool_call in response_message.tool_calls
+            ))
+            for tool_call, content in zip(response_message.tool_calls, results):
+                messages.append({
+                    "tool_call_id": tool_call.id,
+                    "role": "tool",
+                    "name": tool_call.function.name,
+                    "content": content
+                })
             
-            # Second Call: AI answers with the full context now available
-            final_res = client.chat.completions.create(
+            # Next Call: AI answers with the tool results available (no more tools after the last round)
+            rounds += 1
+            more_tools = {"tools": tools, "tool_choice": "auto"} if rounds < CHAT_TOOL_ROUNDS else {}
+            response = await client.chat.completions.create(
                 model=CHAT_MODEL,
-                messages=messages
+                messages=messages,
+                **more_tools
             )
-            return {"response": final_res.choices[0].message.content}
-            
-        else:
-            # No tool called -> Answered based on screen context
-            return {"response": response_message.content}
+            response_message = response.choices[0].message
+        
+        # No (more) tool calls -> final answer
+        return {"response": response_message.content}
             
     except Exception as e:
         print(f"Chat Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def remote_route(client, query, current_screen_context):
+    """LLM router (one extra round trip): True if the full database is needed."""
+    router_messages = [
+        {"role": "system", "content": "You are a routing agent. Your ONLY job is to decide if the user's query requires accessing the FULL database of all 151 movements (e.g. for global stats, counts, or searching for a movement not currently visible). \n\nInput: User Query + Current Visible List.\nOutput: 'YES' if full database is needed. 'NO' if the question can be answered with current list or is general chat. Return ONLY 'YES' or 'NO'."},
+        {"role": "user", "content": f"Current List:\n{current_screen_context}\n\nUser Query: {query}"}
+    ]
+    try:
+        router_res = await client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=router_messages,
+            max_tokens=5,
+            temperature=0
+        )
+        return "YES" in router_res.choices[0].message.content.strip().upper()
+    except Exception as e:
+        print(f"Router Error: {e}. Defaulting to NO.")
+        return False
+
 # --- Serve Frontend (Last Route) ---
 @app.post("/api/chat_stream")
 async def chat_with_ai_stream(req: ChatRequest):
-    client = get_openai_client()
+    request_start = time.perf_counter()
+    store = get_store()
+    client = get_async_client()
     if not client:
         raise HTTPException(status_code=500, detail="OpenAI API Key not set")
 
@@ -1038,28 +1761,24 @@ async def chat_with_ai_stream(req: ChatRequest):
         current_screen_context += "No specific movements currently displayed."
     current_screen_context += "\n--- END OF SEARCH RESULTS ---\n"
 
-    # 2. Router Decision
-    router_messages = [
-        {"role": "system", "content": "You are a routing agent. Your ONLY job is to decide if the user's query requires accessing the FULL database of all 151 movements (e.g. for global stats, counts, or searching for a movement not currently visible). \n\nInput: User Query + Current Visible List.\nOutput: 'YES' if full database is needed. 'NO' if the question can be answered with current list or is general chat. Return ONLY 'YES' or 'NO'."},
-        {"role": "user", "content": f"Current List:\n{current_screen_context}\n\nUser Query: {req.query}"}
-    ]
-    
-    needs_full_db = False
-    try:
-        router_res = client.chat.completions.create(
-            model=CHAT_MODEL,
-            messages=router_messages,
-            max_tokens=5,
-            temperature=0
-        )
-        decision = router_res.choices[0].message.content.strip().upper()
-        if "YES" in decision:
-            needs_full_db = True
-            print(f"Router Decision: YES (Load Full DB) for query: {req.query}")
-        else:
-            print(f"Router Decision: NO (Use Screen Context) for query: {req.query}")
-    except Exception as e:
-        print(f"Router Error: {e}. Defaulting to NO.")
+    # 2. Router Decision: local rules first, the remote LLM router only if configured
+    router_start = time.perf_counter()
+    if ROUTER_MODE == "remote":
+        needs_full_db, reason = None, "remote mode"
+    else:
+        needs_full_db, reason = chat_router.route(req.query, req.context_movements or [], store.chat_names)
+    source = "local"
+    if needs_full_db is None and ROUTER_MODE in ("hybrid", "remote"):
+        source = "remote"
+        needs_full_db = await remote_route(client, req.query, current_screen_context)
+    elif needs_full_db is None:
+        needs_full_db = False  # undecided: answer from the screen, as after a router error
+    router_ms = (time.perf_counter() - router_start) * 1000
+    ROUTER_DECISIONS[f"{source}:{'yes' if needs_full_db else 'no'}"] += 1
+    STAGE_SECONDS.observe(router_ms / 1000, stage="chat_router")
+    CHAT_ROUTES.inc(source=source, decision="yes" if needs_full_db else "no")
+    print(f"Router Decision: {'YES (Load Full DB)' if needs_full_db else 'NO (Use Screen Context)'} "
+          f"via {source} router ({reason}, {router_ms:.1f} ms) for query: {req.query}")
 
     # 3. Construct Context & System Prompt
     system_prompt = """You are an expert Social Movement Research Agent.
@@ -1068,7 +1787,7 @@ async def chat_with_ai_stream(req: ChatRequest):
     
     **YOUR STRATEGY:**
     - **First Priority**: Answer the user's question using ONLY the `Current Search Results` if possible.
-    - **Second Priority**: If the Full Database context is provided below, use it to answer questions about global statistics or movements not on screen.
+    - **Second Priority**: If Database context is provided below (the movements most relevant to the question, and database-wide statistics for statistical questions), use it to answer questions about global statistics or movements not on screen.
     
     **CRITICAL RULES:**
     - **Context Awareness**: The `Current Search Results` list IS the user's screen.
@@ -1078,8 +1797,9 @@ async def chat_with_ai_stream(req: ChatRequest):
     
     user_content = f"{current_screen_context}\n\n"
     if needs_full_db:
-        full_data = generate_full_context_csv()
-        user_content += f"--- FULL DATABASE CONTEXT (Loaded by Router) ---\n{full_data}\n--- END FULL DATABASE ---\n\n"
+        with STAGE_SECONDS.time(stage="chat_context"):
+            full_data = await chat_database_context(store, client, req.query)
+        user_content += f"--- DATABASE CONTEXT (Loaded by Router) ---\n{full_data}\n--- END DATABASE CONTEXT ---\n\n"
         
     user_content += f"User Question: {req.query}"
 
@@ -1089,18 +1809,27 @@ async def chat_with_ai_stream(req: ChatRequest):
     ]
 
     # 4. Stream Generator
-    def generate():
+    async def generate():
+        first_token = True
         try:
-            stream = client.chat.completions.create(
+            stream = await client.chat.completions.create(
                 model=CHAT_MODEL,
                 messages=messages,
                 stream=True
             )
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        first_token = False
+                        ttft_ms = (time.perf_counter() - request_start) * 1000
+                        CHAT_TIMINGS.append({"ttft_ms": ttft_ms, "router_ms": router_ms})
+                        STAGE_SECONDS.observe(ttft_ms / 1000, stage="chat_ttft")
+                        print(f"Chat TTFT: {ttft_ms:.0f} ms (router {source}, {router_ms:.1f} ms)")
                     yield chunk.choices[0].delta.content
         except Exception as e:
             yield f"Error generating response: {str(e)}"
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - request_start, stage="chat_stream_total")
 
     return StreamingResponse(generate(), media_type="text/plain")
 
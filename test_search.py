@@ -0,0 +1,66 @@
+import asyncio
+import dataclasses
+import os
+
+import orjson
+
+os.environ["OPENAI_API_KEY"] = ""  # keyword route, no API calls
+
+import server
+from facet_index import FacetIndex
+from query_parser import parse_constraints
+
+
+def loaded_store():
+    if server.get_store().df_codes.empty:
+        assert server.load_data()
+    return server.get_store()
+
+
+def search(q):
+    loaded_store()
+    response = asyncio.run(server.search_movements(
+        q=q, view="summary", fields=None, limit=20, cursor=None,
+        year_from=None, year_to=None, area=None, theme=None, regime=None))
+    return [m["id"] for m in orjson.loads(response.body)]
+
+
+def test_region_adjectives_stay_in_the_query():
+    for q in ("European Anti-Austerity", "Stop Asian Hate", "African American civil rights"):
+        assert parse_constraints(q) == (q, {})
+    assert parse_constraints("protests in Asia after 2016") == ("protests", {"year_from": 2017, "area": ["AS"]})
+    assert parse_constraints("Europe") == ("", {"area": ["EU"]})
+
+
+def test_theme_takes_its_noun():
+    assert parse_constraints("environmental protests in Europe") == (
+        "", {"area": ["EU"], "Theme_environmental": ["yes"]})
+    assert parse_constraints("environmental movements after 2015") == (
+        "", {"year_from": 2016, "Theme_environmental": ["yes"]})
+    assert parse_constraints("environmental in Europe") == ("", {"area": ["EU"], "Theme_environmental": ["yes"]})
+    assert parse_constraints("social media campaign") == ("social media campaign", {})
+
+
+def test_search_by_theme():
+    store = loaded_store()
+    for q, constraints in (("environmental protests in Europe", {"area": ["EU"], "Theme_environmental": ["yes"]}),
+                           ("environmental movements after 2015", {"year_from": 2016, "Theme_environmental": ["yes"]})):
+        expected = set(store.movements[p].id for p in server.facet_mask(store, constraints).nonzero()[0])
+        found = search(q)
+        assert found and set(found) <= expected
+
+
+def test_unknown_parsed_region_is_dropped():
+    store = loaded_store()
+    # A dataset without Oceania: "in Oceania" must not become a 400
+    df = store.df_codes.assign(area=store.df_codes["area"].replace("OA", "GLOBAL"))
+    server.STORE = dataclasses.replace(store, facet_index=FacetIndex.build(df))
+    try:
+        assert search("climate protests in Oceania")
+    finally:
+        server.STORE = store
+
+
+def test_search_by_movement_name():
+    # "2013-2015 European Anti-Austerity Movement" is coded as GLOBAL, not EU
+    assert search("European Anti-Austerity")[0] == "293"
@@ -0,0 +1,196 @@
+import numpy as np
+import json
+import os
+import time
+
+# --- Memory-Mapped Vector Store ---
+# Replaces embeddings_cache.pkl. Layout inside STORE_DIR:
+#
+#   meta.json              header: format, model, dim, count, dataset hash, generation
+#   vectors-<gen>.f32      float32 row-major (count, dim) matrix, L2-normalized on write
+#   ids-<gen>.txt          one movement ID per line (row order of the matrix)
+#   hashes-<gen>.txt       rich-text hash per row (see embedding_pipeline.text_hash)
+#   ivf-<gen>.npz          optional ANN index over this generation (see ann_index.py)
+#
+# The matrix is opened with np.memmap in read-only mode, so every uvicorn worker
+# shares the same page-cache pages instead of unpickling a private float64 copy.
+# Writers put data files under a new generation and then atomically replace
+# meta.json; readers that still map an older generation are unaffected.
+
+STORE_DIR = "vector_store"
+FORMAT_VERSION = 1
+_WRITE_CHUNK_ROWS = 8192
+
+
+def l2_normalize(matrix):
+    """Row-wise L2 normalization (zero rows stay zero)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _paths(store_dir, generation):
+    return (
+        os.path.join(store_dir, f"vectors-{generation}.f32"),
+        os.path.join(store_dir, f"ids-{generation}.txt"),
+        os.path.join(store_dir, f"hashes-{generation}.txt"),
+    )
+
+
+def _write_lines(path, values):
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write("\n".join(values))
+
+
+def _read_lines(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    return text.split("\n") if text else []
+
+
+def _write_header(store_dir, meta):
+    path = os.path.join(store_dir, "meta.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_header(store_dir=STORE_DIR):
+    path = os.path.join(store_dir, "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT_VERSION:
+        print(f"Ignoring vector store with unsupported format {meta.get('format')}.")
+        return None
+    return meta
+
+
+def write_store(vectors, ids, hashes, model, dataset_hash, store_dir=STORE_DIR):
+    """Write a new generation of the store and publish it. Returns the header dict."""
+    if len(vectors) != len(ids):
+        raise ValueError("vectors, ids and hashes must have the same length")
+    # Chunked so a large corpus is never held twice in memory
+    chunks = (vectors[start:start + _WRITE_CHUNK_ROWS] for start in range(0, len(ids), _WRITE_CHUNK_ROWS))
+    return write_store_chunks(chunks, ids, hashes, model, dataset_hash, store_dir)
+
+
+def write_store_chunks(chunks, ids, hashes, model, dataset_hash, store_dir=STORE_DIR):
+    """write_store for vectors given as an iterable of (rows, dim) blocks, in ID order.
+
+    Only one block is in memory at a time, so a generation can be assembled from
+    the previous one's memmap plus new vectors without building the full matrix.
+    """
+    if len(ids) != len(hashes):
+        raise ValueError("vectors, ids and hashes must have the same length")
+    if any("\n" in str(i) for i in ids):
+        raise ValueError("IDs may not contain newlines")
+
+    os.makedirs(store_dir, exist_ok=True)
+    generation = f"{time.time_ns():x}"
+    vec_path, ids_path, hashes_path = _paths(store_dir, generation)
+
+    count, dim = len(ids), 0
+    written = 0
+    with open(vec_path, 'wb') as f:
+        for chunk in chunks:
+            chunk = l2_normalize(chunk)
+            dim = chunk.shape[1]
+            written += len(chunk)
+            f.write(chunk.tobytes(order='C'))
+    if written != count:
+        os.remove(vec_path)
+        raise ValueError("vectors, ids and hashes must have the same length")
+    _write_lines(ids_path, [str(i) for i in ids])
+    _write_lines(hashes_path, [h or "" for h in hashes])
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "generation": generation,
+        "model": model,
+        "dim": dim,
+        "count": count,
+        "dtype": "float32",
+        "normalized": True,
+        "dataset_hash": dataset_hash,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    _write_header(store_dir, meta)
+    _prune(store_dir, generation)
+    return meta
+
+
+def update_dataset_hash(dataset_hash, store_dir=STORE_DIR):
+    """Re-stamp the header for a new dataset version whose vectors did not change."""
+    meta = read_header(store_dir)
+    if meta is not None and meta.get("dataset_hash") != dataset_hash:
+        meta["dataset_hash"] = dataset_hash
+        _write_header(store_dir, meta)
+
+
+def _prune(store_dir, keep_generation):
+    for name in os.listdir(store_dir):
+        stem, _, _ = name.partition(".")
+        _, _, generation = stem.partition("-")
+        if generation and generation != keep_generation and name.split("-")[0] in ("vectors", "ids", "hashes", "ivf"):
+            try:
+                os.remove(os.path.join(store_dir, name))
+            except OSError:
+                # Windows refuses to delete a file another worker still maps
+                pass
+
+
+def read_store(store_dir=STORE_DIR):
+    """Open the current generation. Returns dict(vectors=read-only memmap, ids, hashes, model, ...) or None."""
+    meta = read_header(store_dir)
+    if meta is None:
+        return None
+    vec_path, ids_path, hashes_path = _paths(store_dir, meta["generation"])
+    count, dim = meta["count"], meta["dim"]
+    if count == 0:
+        vectors = np.zeros((0, dim), dtype=np.float32)
+    else:
+        expected = count * dim * 4
+        if os.path.getsize(vec_path) != expected:
+            print(f"Vector store is truncated ({os.path.getsize(vec_path)} of {expected} bytes). Ignoring it.")
+            return None
+        vectors = np.memmap(vec_path, dtype=np.float32, mode='r', shape=(count, dim))
+    ids = _read_lines(ids_path)
+    hashes = [h or None for h in _read_lines(hashes_path)]
+    if len(ids) != count or len(hashes) != count:
+        print("Vector store sidecars do not match the header. Ignoring it.")
+        return None
+    return {
+        "vectors": vectors,
+        "ids": ids,
+        "hashes": hashes,
+        "model": meta["model"],
+        "dim": dim,
+        "dataset_hash": meta.get("dataset_hash"),
+        "generation": meta["generation"],
+    }
+
+
+def migrate_pickle(pickle_path, store_dir=STORE_DIR, dataset_hash=""):
+    """One-off conversion of a legacy embeddings_cache.pkl you trust. Returns True if converted."""
+    import pickle
+    if not os.path.exists(pickle_path):
+        return False
+    with open(pickle_path, 'rb') as f:
+        data = pickle.load(f)
+    ids = [str(i) for i in data['ids']]
+    hashes = data.get('hashes') or [None] * len(ids)
+    write_store(np.asarray(data['vectors']), ids, hashes, data.get('model') or "", dataset_hash, store_dir)
+    print(f"Migrated {len(ids)} vectors from {pickle_path} to {store_dir}/.")
+    return True
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 2:
+        print("Usage: python vector_store.py LEGACY_EMBEDDINGS_CACHE.pkl")
+        sys.exit(1)
+    migrate_pickle(sys.argv[1])